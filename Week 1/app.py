@@ -1,88 +1,68 @@
 import dash_mantine_components as dmc
 from dash_iconify import DashIconify
-from dash import html, dcc, callback, Input, Output
+from dash import html, dcc, callback, ClientsideFunction, Input, Output, State
 import dash
+import os
+import sys
 import pandas as pd
 import dash_ag_grid as dag
 import plotly.express as px
-import io
-from datetime import datetime, time
-from dateutil.relativedelta import relativedelta
-
-app = dash.Dash(__name__)
-
-df = pd.read_csv(r"NYC Marathon Results, 2024 - Marathon Runner Results.csv")
-
-
-def convert_str_to_time(string):
-    count = string.count(":")
-   
-    if count == 1:
-        if "." in string:
-            result = datetime.strptime(string, '%M:%S.%f')
-        else:
-            result = datetime.strptime(string, '%M:%S')
-    elif count == 2:
-        days_add= None
-        h, m, s = string.split(':')
-        if int(h)>=24:
-            days_add = int(h)//24
-        if days_add:
-            string = '00' + string[2:]
-            if "." in string:
-                result = datetime.strptime(string, '%H:%M:%S.%f') + relativedelta(days=days_add)
-            else:
-                result = datetime.strptime(string, '%H:%M:%S') + relativedelta(days=days_add)
-        elif "." in string:
-            result = datetime.strptime(string, '%H:%M:%S.%f')
-        else:
-            result = datetime.strptime(string, '%H:%M:%S')
-    midnight = result.replace(hour=0, minute=0, second=0, microsecond=0)
-    time_from_midnight = result - midnight
-    return round(time_from_midnight.total_seconds()/60, 2)
-
-def get_age_group(age, start=10, end=90, step=10):
-    age_groups = [
-        {"group": f"{i}-{i + step}", "min_age": i, "max_age": i + step - 1}
-        for i in range(start, end, step)
-    ]
-    age_groups.append({"group": f"{end}+", "min_age": end, "max_age": float("inf")})
-
-    def find_group(single_age):
-        for group in age_groups:
-            if group["min_age"] <= single_age <= group["max_age"]:
-                return group["group"]
-        return "Unknown Age Group"
-
-    if isinstance(age, list):
-        return [find_group(a) for a in age]
-    else:
-        return find_group(age)
-
-
-df["ageGroup"] = get_age_group(df["age"].values.tolist())
-
-filter_cols = [
-    "firstName",
-    "age",
-    "ageGroup",
-    "gender",
-    "city",
-    "countryCode",
-    "stateProvince",
-    "overallPlace",
-    "overallTime",
-    "pace",
-    "genderPlace",
-    "ageGradeTime",
-    "ageGradePlace",
-    "ageGradePercent",
-    "racesCount",
-]
-df = df[filter_cols]
-df = df.dropna()
+from flask import request
+from functools import lru_cache
+from urllib.parse import urlencode
+
+# Modules shared by both dashboards live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import *
+from common.exports import DOWNLOAD_EXPORT_JS, export_response
+from common.metrics import instrument
+from data_cache import RESULTS_CSV, load_results
+from results_store import (
+    FORK_AVAILABLE,
+    RESULTS_DIR,
+    ingest_directory,
+    load_store,
+    load_store_aggregates,
+    store_partitions,
+)
+from live import LIVE_INTERVAL_MS, LIVE_SOURCE, LiveResults
+from search import build_search_index, search_rows, search_runners
+from distributions import (
+    FINISH_BINS,
+    PACE_BINS,
+    dense_histograms,
+    histogram_figure,
+    summary_table,
+    violin_figure,
+)
 
-df['DecimalPace'] = df['pace'].apply(lambda x : convert_str_to_time(x) )
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
+server = app.server
+callback_metrics = instrument(app)
+
+# Filter the Demographic Analysis charts in the browser instead of calling back
+CLIENTSIDE_GENDER_FILTER = os.environ.get("MARATHON_CLIENTSIDE_FILTER", "1") == "1"
+
+# A directory of result files (one per race and year) takes precedence over
+# the single 2024 CSV unless it holds none; only new or changed files are
+# parsed on start
+# Race-day mode: results are tailed from a growing CSV or a queue directory
+# and every aggregate below is updated from the new rows only
+live = LiveResults(LIVE_SOURCE) if LIVE_SOURCE else None
+if not live and os.path.isdir(RESULTS_DIR):
+    # Spawned pool workers would re-import this module, so parse in-process there
+    ingest_directory(RESULTS_DIR, workers=None if FORK_AVAILABLE else 0)
+if live:
+    live.poll()
+    df = live.frame()
+    cube = live.cube()
+elif os.path.isdir(RESULTS_DIR) and store_partitions():
+    df = load_store()
+    cube = load_store_aggregates()
+else:
+    df = load_results(RESULTS_CSV)
+    cube = build_aggregate_cube(df)
 
 header_names = [
     "Runner Name",
@@ -102,11 +82,18 @@ header_names = [
     "Total Races Run",
 ]
 rename_dict = dict(zip(filter_cols, header_names))
+rename_dict.update({"race": "Race", "year": "Year"})
 
 total_participants = len(df)
 total_nationalities = df["countryCode"].nunique()
 male_participants = len(df[df["gender"] == "M"])
 female_participants = len(df[df["gender"] == "W"])
+kpis = {
+    "total_participants": total_participants,
+    "total_nationalities": total_nationalities,
+    "male_participants": male_participants,
+    "female_participants": female_participants,
+}
 
 
 def kpi_card(icon_name, title, value, icon_color, card_color="#ffffff"):
@@ -147,30 +134,31 @@ def kpi_card(icon_name, title, value, icon_color, card_color="#ffffff"):
 
 
 def get_kpi_cards_group(data={}, card_color=False):
+    data = {**kpis, **data}
     return dmc.Group(
         [
             kpi_card(
                 "noto:person-running-facing-right-medium-light-skin-tone",
                 "Runners",
-                total_participants,
+                data["total_participants"],
                 icon_color="#d20303",
             ),
             kpi_card(
                 "gis:search-country",
                 "Nationalities",
-                total_nationalities,
+                data["total_nationalities"],
                 icon_color="#ffa500",
             ),
             kpi_card(
                 "twemoji:male-sign",
                 "Men Runners",
-                male_participants,
+                data["male_participants"],
                 icon_color="#119dff",
             ),
             kpi_card(
                 "twemoji:female-sign",
                 "Women Runners",
-                female_participants,
+                data["female_participants"],
                 icon_color="#00bfff",
             ),
         ],
@@ -179,55 +167,72 @@ def get_kpi_cards_group(data={}, card_color=False):
     )
 
 
-df['Country'] = df["countryCode"].apply(lambda x: 'USA' if x=='USA' else 'Abroad')
-fdf = df.groupby(["age", "gender", 'Country']).size().reset_index(name="count")
-fdf = fdf[fdf['gender'].isin(['M', 'W'])]
+def get_runners_by_age_chart(fdf=None):
+    if fdf is None and live:
+        fdf = live.runners_by_age()
+    elif fdf is None:
+        fdf = df.groupby(["age", "gender", 'Country'], observed=True).size().reset_index(name="count")
+    fdf = fdf[fdf['gender'].isin(['M', 'W'])]
 
-fig1 = px.scatter(
-    fdf, 
-    x='age', 
-    y='count', 
-    color='Country',  
-    color_discrete_map={"Abroad": "#ef553b", "USA": "#636efa"},
+    fig1 = px.scatter(
+        fdf, 
+        x='age', 
+        y='count', 
+        color='Country',  
+        color_discrete_map={"Abroad": "#ef553b", "USA": "#636efa"},
 
-    size='count',     
-    facet_col="gender",
-    labels={'age': 'Age', 'count': 'No. of Runners', 'Country': 'Country', 'gender':'Gender'},  
-)
+        size='count',     
+        facet_col="gender",
+        labels={'age': 'Age', 'count': 'No. of Runners', 'Country': 'Country', 'gender':'Gender'},  
+    )
+    return optimize_figure(fig1, "runners_by_age")
+
+
+def get_avg_pace_by_age_chart(ddf=None):
+    if ddf is None and live:
+        ddf = live.avg_pace_by_age()
+    elif ddf is None:
+        ddf = df.groupby(["age", "gender", 'Country'], observed=True)["DecimalPace"].mean().astype("float64").reset_index()
+    ddf.rename(columns={"DecimalPace": "AvgPace"}, inplace=True)
+    ddf = ddf[ddf['gender'].isin(['M', 'W'])]
+    fig2 = px.line(
+        ddf.round(2), 
+        x='age', 
+        y='AvgPace', 
+        color='Country',   
+        color_discrete_map={"Abroad": "#ef553b", "USA": "#636efa"},
+        facet_col="gender",
+        labels={'age': 'Age', 'AvgPace': 'Avg Duration (Minutes/Mile)', 'Country': 'Country', 'gender':'Gender'},  
+    )
+    return optimize_figure(fig2, "avg_pace_by_age")
 
-ddf = df.groupby(["age", "gender", 'Country'])["DecimalPace"].mean().reset_index()
-ddf.rename(columns={"DecimalPace": "AvgPace"}, inplace=True)
-ddf = ddf[ddf['gender'].isin(['M', 'W'])]
-fig2 = px.line(
-    ddf.round(2), 
-    x='age', 
-    y='AvgPace', 
-    color='Country',   
-    color_discrete_map={"Abroad": "#ef553b", "USA": "#636efa"},
-    facet_col="gender",
-    labels={'age': 'Age', 'AvgPace': 'Avg Duration (Minutes/Mile)', 'Country': 'Country', 'gender':'Gender'},  
-)
 
-ov_layout = html.Div(
+# The interval lives on the Overview tab so idle tabs don't poll
+live_components = (
     [
-        dmc.Space(h=10),
-        get_kpi_cards_group(),
-        html.H3("Number of Runners Registered by Age: USA vs Abroad"),
-        dcc.Graph(figure=fig1),
-        html.H3("Avg Duration (Minutes/Mile) of Runners by Age: USA vs Abroad"),
-        dcc.Graph(figure=fig2),
-
-        
+        dcc.Interval(id="live-interval", interval=LIVE_INTERVAL_MS),
+        dcc.Store(id="live-version"),
     ]
+    if live
+    else []
 )
 
+
+def get_ov_layout():
+    return html.Div(
+        [
+            dmc.Space(h=10),
+            html.Div(get_kpi_cards_group(), id="kpi-cards"),
+            html.H3("Number of Runners Registered by Age: USA vs Abroad"),
+            dcc.Graph(id="runners-by-age-fig", figure=get_runners_by_age_chart()),
+            html.H3("Avg Duration (Minutes/Mile) of Runners by Age: USA vs Abroad"),
+            dcc.Graph(id="avg-pace-by-age-fig", figure=get_avg_pace_by_age_chart()),
+        ]
+        + live_components
+    )
+
 def get_age_group_chart(gender=None):
-    d1_data = df.groupby(["ageGroup", "gender"]).size().reset_index(name="count")
-    if gender:
-        if isinstance(gender, list):
-            d1_data = d1_data[d1_data["gender"].isin(gender)]
-        elif isinstance(gender, str):
-            d1_data = d1_data[d1_data["gender"] == gender]
+    d1_data = filter_gender(cube["age"], gender)
     fig = px.bar(
         d1_data,
         x="ageGroup",
@@ -255,16 +260,7 @@ def get_age_group_chart(gender=None):
  
  
 def get_country_group_chart(gender=None):
-    d2_data = df.groupby(["countryCode", "gender"]).size().reset_index(name="count")
-    d2_data = d2_data.sort_values(by="count", ascending=False)
-    d2_data = d2_data[
-        d2_data["countryCode"].isin(d2_data["countryCode"].unique()[:10])
-    ].reset_index(drop=True)
-    if gender:
-        if isinstance(gender, list):
-            d2_data = d2_data[d2_data["gender"].isin(gender)]
-        elif isinstance(gender, str):
-            d2_data = d2_data[d2_data["gender"] == gender]
+    d2_data = filter_gender(cube["country"], gender)
     fig = px.bar(
         d2_data,
         y="countryCode",
@@ -296,13 +292,7 @@ def get_country_group_chart(gender=None):
  
  
 def get_avg_pace_chart(gender=None):
-    d3_data = df.groupby(["ageGroup", "gender"])["DecimalPace"].mean().reset_index()
-    d3_data.rename(columns={"DecimalPace": "AvgPace"}, inplace=True)
-    if gender:
-        if isinstance(gender, list):
-            d3_data = d3_data[d3_data["gender"].isin(gender)]
-        elif isinstance(gender, str):
-            d3_data = d3_data[d3_data["gender"] == gender]
+    d3_data = filter_gender(cube["pace"], gender)
     fig = px.bar(
         d3_data.round(2),
         y="AvgPace",
@@ -331,13 +321,7 @@ def get_avg_pace_chart(gender=None):
  
  
 def get_race_chart(gender=None):
-    d4_data = df[["firstName", "racesCount", "gender"]]
-    d4_data = d4_data.sort_values(by="racesCount", ascending=True).tail(10)
-    if gender:
-        if isinstance(gender, list):
-            d4_data = d4_data[d4_data["gender"].isin(gender)]
-        elif isinstance(gender, str):
-            d4_data = d4_data[d4_data["gender"] == gender]
+    d4_data = filter_gender(cube["races"], gender)
     fig = px.bar(
         d4_data,
         y="firstName",
@@ -364,6 +348,26 @@ def get_race_chart(gender=None):
     )
     return fig
 
+# Figures are cached per normalized selection, so ['W', 'M'] and ['M', 'W']
+# share an entry; gender_figures.cache_info() reports hits and misses
+@lru_cache(maxsize=16)
+def gender_figures(gender):
+    gender = list(gender) or None
+    return (
+        get_age_group_chart(gender).to_dict(),
+        get_country_group_chart(gender).to_dict(),
+        get_avg_pace_chart(gender).to_dict(),
+        get_race_chart(gender).to_dict(),
+    )
+
+
+def get_dem_layout():
+    # In clientside mode the unfiltered figures ship once with the tab and the
+    # browser drops the traces of unselected genders (see assets/clientside.js)
+    figures = list(gender_figures(())) if CLIENTSIDE_GENDER_FILTER else None
+    return html.Div([dcc.Store(id="dem-figures", data=figures), dem_layout])
+
+
 dem_layout = html.Div(
     [
         dmc.Space(h=10),
@@ -395,25 +399,137 @@ dem_layout = html.Div(
     ]
 )
 
+distribution_stores = {
+    "pace": dense_histograms(cube["pace_hist"], PACE_BINS),
+    "finish": dense_histograms(cube["finish_hist"], FINISH_BINS),
+}
+distribution_labels = {
+    "pace": "Pace (Minutes/Mile)",
+    "finish": "Finish Time (Minutes)",
+}
+
+
+@lru_cache(maxsize=32)
+def distribution_figures(metric, by, gender):
+    store, label = distribution_stores[metric], distribution_labels[metric]
+    filters = {"gender": list(gender)} if gender else {}
+    table = summary_table(store, by, **filters)
+    return (
+        histogram_figure(store, by, label, **filters).to_dict(),
+        violin_figure(store, by, label, **filters).to_dict(),
+        table.to_dict("records"),
+    )
+
+
+dist_layout = html.Div(
+    [
+        dmc.Space(h=10),
+        dmc.Group(
+            [
+                dmc.SegmentedControl(
+                    id="dist-metric",
+                    data=[
+                        {"label": "Pace", "value": "pace"},
+                        {"label": "Finish Time", "value": "finish"},
+                    ],
+                    value="pace",
+                ),
+                dmc.Select(
+                    id="dist-by",
+                    label="Compare By",
+                    data=[
+                        {"label": "Gender", "value": "gender"},
+                        {"label": "Age Group", "value": "ageGroup"},
+                        {"label": "USA vs Abroad", "value": "Country"},
+                    ],
+                    value="gender",
+                ),
+                dmc.MultiSelect(
+                    id="dist-gender",
+                    label="Gender",
+                    data=[
+                        {"label": "Men", "value": "M"},
+                        {"label": "Women", "value": "W"},
+                        {"label": "Other", "value": "X"},
+                    ],
+                    clearable=True,
+                ),
+            ],
+            position="center",
+        ),
+        dmc.Group(
+            [dcc.Graph(id="dist-histogram-fig"), dcc.Graph(id="dist-violin-fig")],
+            position="apart",
+        ),
+        dag.AgGrid(
+            id="dist-percentiles",
+            columnSize="sizeToFit",
+            style={"height": "260px", "width": "100%"},
+        ),
+    ]
+)
+
+
+def data_version():
+    return live.version if live else 0
+
+
+def results_frame():
+    # In race-day mode the batches are only joined once rows are asked for
+    return live.frame() if live else df
+
+
+# The index is built on first use for each data version, so live polls that
+# nobody searches don't pay for it
+@lru_cache(maxsize=1)
+def search_index(version):
+    return build_search_index(results_frame())
+
+
+# Only the positions of the hits are cached; the grid reads rows from the frame
+@lru_cache(maxsize=32)
+def search_view(query, version):
+    return search_rows(search_index(version), query)
+
+
 tabular_layout = html.Div(
     [
+        dmc.Space(h=10),
+        dmc.TextInput(
+            id="runner-search",
+            placeholder="Search runners by name, city, state or country",
+            icon=DashIconify(icon="tabler:search"),
+            debounce=300,
+            style={"width": "40%"},
+        ),
         dmc.Space(h=10),
         dag.AgGrid(
-            rowData=df.to_dict("records"),
+            id="results-grid",
+            rowModelType="infinite",
             columnDefs=[
-                {"field": c, "headerName": rename_dict.get(c)} for c in df.columns
+                {
+                    "field": c,
+                    "headerName": rename_dict.get(c),
+                    "filter": "agNumberColumnFilter"
+                    if pd.api.types.is_numeric_dtype(df[c])
+                    else "agTextColumnFilter",
+                }
+                for c in df.columns
             ],
             defaultColDef={
-                "wrapText": True,
-                "cellStyle": {"wordBreak": "normal", "lineHeight": "unset"},
-                "autoHeight": True,
                 "wrapHeaderText": True,
                 "autoHeaderHeight": True,
                 "sortable": True,
-                "filter": True,
                 "floatingFilter": True,
                 "resizable": True,
             },
+            dashGridOptions={
+                "pagination": True,
+                "paginationPageSize": 100,
+                "cacheBlockSize": 100,
+                "maxBlocksInCache": 10,
+                "rowBuffer": 0,
+            },
             style={"height": "540px", "width": "100%"},
         ),
     ]
@@ -422,8 +538,30 @@ tabular_layout = html.Div(
 
 app.layout = html.Div(
     [
-        dmc.Group([html.H1("Plotly Figure Friday 2025 - Exploring NYC Marathon Data"), dmc.Button('Export Data', id='export-btn')], position='apart'),
-         dcc.Download(id="download-data"),
+        dmc.Group(
+            [
+                html.H1("Plotly Figure Friday 2025 - Exploring NYC Marathon Data"),
+                dmc.Group(
+                    [
+                        dmc.Select(
+                            id="export-format",
+                            data=[
+                                {"label": "CSV", "value": "csv"},
+                                {"label": "CSV (gzip)", "value": "csv.gz"},
+                                {"label": "Parquet", "value": "parquet"},
+                            ],
+                            value="csv",
+                            style={"width": "130px"},
+                        ),
+                        dmc.Button('Export Data', id='export-btn'),
+                        dmc.Text(id="export-error", color="red", size="sm"),
+                    ]
+                ),
+            ],
+            position='apart',
+        ),
+        dcc.Store(id="export-url"),
+        dcc.Store(id="gender-store"),
         dmc.Tabs(
             [
                 dmc.TabsList(
@@ -438,6 +576,11 @@ app.layout = html.Div(
                             value="dem",
                             icon=DashIconify(icon="foundation:results-demographics"),
                         ),
+                        dmc.Tab(
+                            "Distributions",
+                            value="dist",
+                            icon=DashIconify(icon="mdi:chart-bell-curve"),
+                        ),
                         dmc.Tab(
                             "Tabular Data",
                             value="tabular",
@@ -446,10 +589,12 @@ app.layout = html.Div(
                     ],
                     grow=True,
                 ),
-                dmc.TabsPanel(ov_layout, value="ov"),
-                dmc.TabsPanel(dem_layout, value="dem"),
-                dmc.TabsPanel(tabular_layout, value="tabular"),
+                dmc.TabsPanel(html.Div(id="ov-panel"), value="ov"),
+                dmc.TabsPanel(html.Div(id="dem-panel"), value="dem"),
+                dmc.TabsPanel(html.Div(id="dist-panel"), value="dist"),
+                dmc.TabsPanel(html.Div(id="tabular-panel"), value="tabular"),
             ],
+            id="tabs",
             color="red",
             value="ov",
         ),
@@ -457,37 +602,189 @@ app.layout = html.Div(
 )
 
 
+tab_builders = {
+    "ov": get_ov_layout,
+    "dem": get_dem_layout,
+    "dist": lambda: dist_layout,
+    "tabular": lambda: tabular_layout,
+}
+
+
+# Tab contents are built the first time any user opens them, then reused
+@lru_cache(maxsize=None)
+def tab_content(tab):
+    return tab_builders[tab]()
+
+
 @callback(
+    *[Output(f"{name}-panel", "children") for name in tab_builders],
+    Input("tabs", "value"),
+    *[State(f"{name}-panel", "children") for name in tab_builders],
+)
+def render_tab(tab, *rendered):
+    # Panels that are already on the page keep their state (e.g. the gender filter)
+    return [
+        tab_content(name) if name == tab and current is None else dash.no_update
+        for name, current in zip(tab_builders, rendered)
+    ]
+
+
+# Panels already open in a browser redraw when live results arrive
+live_inputs = [Input("live-version", "data")] if live else []
+
+
+@callback(
+    Output("dist-histogram-fig", "figure"),
+    Output("dist-violin-fig", "figure"),
+    Output("dist-percentiles", "rowData"),
+    Output("dist-percentiles", "columnDefs"),
+    Input("dist-metric", "value"),
+    Input("dist-by", "value"),
+    Input("dist-gender", "value"),
+    *live_inputs,
+)
+def update_distribution(metric, by, gender, version=None):
+    histogram, violin, rows = distribution_figures(metric, by, normalize_gender(gender))
+    column_defs = [{"field": c} for c in (rows[0] if rows else [])]
+    return histogram, violin, rows, column_defs
+
+
+def refresh_live_aggregates():
+    # Only the aggregates are updated here, from the new batch's partials;
+    # shared tables are swapped in place and cached figures and tabs built from
+    # the old data are dropped. The grid, search and /export read the rows
+    # through results_frame() and search_index(), keyed on the version
+    cube.update(live.cube())
+    distribution_stores["pace"] = dense_histograms(cube["pace_hist"], PACE_BINS)
+    distribution_stores["finish"] = dense_histograms(cube["finish_hist"], FINISH_BINS)
+    kpis.update(live.kpis())
+    gender_figures.cache_clear()
+    distribution_figures.cache_clear()
+    tab_content.cache_clear()
+
+
+if live:
+
+    @callback(
+        Output("kpi-cards", "children"),
+        Output("runners-by-age-fig", "figure"),
+        Output("avg-pace-by-age-fig", "figure"),
+        Output("live-version", "data"),
+        Input("live-interval", "n_intervals"),
+        State("live-version", "data"),
+    )
+    def update_live(n_intervals, version):
+        live.poll(on_update=refresh_live_aggregates)
+        current = live.version
+        if version == current:
+            raise dash.exceptions.PreventUpdate
+        return (
+            get_kpi_cards_group(),
+            get_runners_by_age_chart(),
+            get_avg_pace_by_age_chart(),
+            current,
+        )
+
+    @callback(
+        Output("dem-figures", "data"),
+        Input("live-version", "data"),
+        prevent_initial_call=True,
+    )
+    def update_live_dem_figures(version):
+        if not CLIENTSIDE_GENDER_FILTER:
+            raise dash.exceptions.PreventUpdate
+        return list(gender_figures(()))
+
+
+@callback(Output("gender-store", "data"), Input("gender-select", "value"))
+def store_gender(gender):
+    return gender
+
+
+def update_gender(gender, version=None):
+    return gender_figures(normalize_gender(gender))
+
+
+gender_outputs = [
     Output("age_group_fig", "figure"),
     Output("country_group_fig", "figure"),
     Output("avg_pace_fig", "figure"),
     Output("race_fig", "figure"),
-    Input("gender-select", "value"),
+]
+if CLIENTSIDE_GENDER_FILTER:
+    app.clientside_callback(
+        ClientsideFunction(namespace="marathon", function_name="filterGender"),
+        *gender_outputs,
+        Input("gender-select", "value"),
+        Input("dem-figures", "data"),
+    )
+else:
+    callback(*gender_outputs, Input("gender-select", "value"), *live_inputs)(update_gender)
+
+
+@callback(
+    Output("results-grid", "getRowsResponse"),
+    Input("results-grid", "getRowsRequest"),
+    State("runner-search", "value"),
 )
-def update_gender(gender):
-    if gender:
-        age = get_age_group_chart(gender)
-        country = get_country_group_chart(gender)
-        pace = get_avg_pace_chart(gender)
-        race = get_race_chart(gender)
-    else:
-        age = get_age_group_chart()
-        country = get_country_group_chart()
-        pace = get_avg_pace_chart()
-        race = get_race_chart()
-    return age, country, pace, race
+def load_grid_rows(rows_request, query):
+    if rows_request is None:
+        raise dash.exceptions.PreventUpdate
+    query = (query or "").strip()
+    version = data_version()
+    frame = results_frame()
+    if query:
+        rows = search_view(query, version)
+        return get_rows_block(frame, rows_request, query, version, rows=rows)
+    return get_rows_block(frame, rows_request, version=version)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="marathon", function_name="refreshGrid"),
+    Input("runner-search", "value"),
+    *live_inputs,
+    prevent_initial_call=True,
+)
+
+
+@app.server.route("/api/search")
+def search_api():
+    query = request.args.get("q", "")
+    limit = min(request.args.get("limit", 50, type=int), 500)
+    version = data_version()
+    rows = search_runners(results_frame(), search_index(version), query, limit)
+    return {"query": query, "rows": to_records(rows)}
+
+
+@app.server.route("/export")
+def export_data():
+    gender = [g for g in request.args.get("gender", "").split(",") if g]
+    return export_response(
+        filter_gender(results_frame(), gender),
+        request.args.get("format", "csv"),
+        "NYC_marathon_data",
+    )
 
 
 @app.callback(
-    Output("download-data", "data"),
+    Output("export-url", "data"),
     Input("export-btn", "n_clicks"),
+    State("export-format", "value"),
+    State("gender-store", "data"),
     prevent_initial_call=True
 )
-def export_dataframe(n_clicks):
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_buffer.seek(0)      
-    return dcc.send_bytes(csv_buffer.getvalue().encode(), "NYC_marathon_data.csv")
+def export_dataframe(n_clicks, fmt, gender):
+    # n_clicks keeps the URL unique so repeated clicks trigger a new download
+    query = {"format": fmt or "csv", "gender": ",".join(gender or []), "n": n_clicks}
+    return "/export?" + urlencode(query)
+
+
+app.clientside_callback(
+    DOWNLOAD_EXPORT_JS,
+    Output("export-error", "children"),
+    Input("export-url", "data"),
+    prevent_initial_call=True,
+)
 
 if __name__ == "__main__":
     app.run_server(debug=True)
@@ -0,0 +1,32 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    marathon: {
+        // figures holds the four unfiltered Demographic charts; px puts one trace
+        // per gender in each, tagged with the gender code as its legendgroup
+        filterGender: function (gender, figures) {
+            if (!figures) {
+                return Array(4).fill(window.dash_clientside.no_update);
+            }
+            if (!gender || gender.length === 0) {
+                return figures;
+            }
+            return figures.map(function (figure) {
+                return Object.assign({}, figure, {
+                    data: figure.data.filter(function (trace) {
+                        return gender.indexOf(trace.legendgroup) !== -1;
+                    }),
+                });
+            });
+        },
+
+        // The grid's infinite row model only asks for rows again once its
+        // cache is purged; the server reads the search box as State. Called
+        // for a new search or new live results, without outputs
+        refreshGrid: function () {
+            try {
+                dash_ag_grid.getApi("results-grid").purgeInfiniteCache();
+            } catch (e) {
+                // Not mounted yet; it asks for fresh rows when it is
+            }
+        },
+    },
+});
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+
+import pandas as pd
+
+# Modules shared by both dashboards live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import memory_report, prepare_results
+from common import file_cache
+from common.file_cache import write_cache
+
+RESULTS_CSV = "NYC Marathon Results, 2024 - Marathon Runner Results.csv"
+CACHE_DIR = os.environ.get("MARATHON_CACHE_DIR", ".cache")
+# Bump whenever prepare_results changes so stale caches are ignored
+PIPELINE_VERSION = 4
+# Serve the frame straight from the mapped cache so gunicorn workers share its pages
+SHARED_DATA = os.environ.get("MARATHON_SHARED_DATA", "0") == "1"
+
+
+def cache_path(source, cache_dir=CACHE_DIR):
+    return file_cache.cache_path(source, cache_dir, PIPELINE_VERSION, ".feather")
+
+
+def build_cache(source, cache_dir=CACHE_DIR):
+    import pyarrow.feather as feather
+
+    df = prepare_results(pd.read_csv(source))
+    # Uncompressed so that warm starts can memory-map the file
+    write_cache(
+        cache_path(source, cache_dir),
+        lambda tmp: feather.write_feather(df, tmp, compression="uncompressed"),
+    )
+    return df
+
+
+def read_cache(path, shared=False):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, memory_map=True)
+    if not shared:
+        return table.to_pandas()
+    # Numeric columns become views onto the mapping and strings stay in Arrow
+    # buffers, so every process reads the same read-only page-cache pages
+    return table.to_pandas(
+        split_blocks=True,
+        types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get,
+    )
+
+
+def load_results(source=RESULTS_CSV, cache_dir=CACHE_DIR, shared=SHARED_DATA):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return prepare_results(pd.read_csv(source))
+
+    path = cache_path(source, cache_dir)
+    if os.path.exists(path):
+        return read_cache(path, shared)
+    df = build_cache(source, cache_dir)
+    return read_cache(path, shared) if shared else df
+
+
+def clear_cache(source=None, cache_dir=CACHE_DIR):
+    return file_cache.clear_cache(source, cache_dir, ".feather")
+
+
+def startup_report(source=RESULTS_CSV, cache_dir=CACHE_DIR):
+    start = time.perf_counter()
+    prepare_results(pd.read_csv(source))
+    cold = time.perf_counter() - start
+
+    if not os.path.exists(cache_path(source, cache_dir)):
+        build_cache(source, cache_dir)
+
+    start = time.perf_counter()
+    read_cache(cache_path(source, cache_dir))
+    warm = time.perf_counter() - start
+
+    print(f"cold start (read_csv + derive): {cold:.3f}s")
+    print(f"warm start (hash + mapped cache): {warm:.3f}s")
+    print(f"speedup: {cold / warm:.1f}x")
+    print()
+    print(memory_report(prepare_results(pd.read_csv(source), schema=False)))
+
+
+if __name__ == "__main__":
+    file_cache.cache_cli(
+        "Manage the marathon results cache",
+        RESULTS_CSV,
+        CACHE_DIR,
+        build_cache,
+        clear_cache,
+        cache_path,
+        startup_report,
+    )
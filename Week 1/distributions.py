@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+HIST_KEYS = ["ageGroup", "gender", "Country"]
+# Fixed-width bins shared by every partition, so histograms merge by addition;
+# values outside the range fall into the first or last bin
+PACE_BINS = {"start": 4.0, "width": 0.1, "count": 260}  # 4:00 to 30:00 min/mile
+FINISH_BINS = {"start": 120.0, "width": 1.0, "count": 600}  # 2h to 12h, in minutes
+PERCENTILES = [10, 25, 50, 75, 90]
+GROUP_COLORS = {"W": "#ef553b", "M": "#636efa", "X": "#8f8f8f", "Abroad": "#ef553b", "USA": "#636efa"}
+GROUP_NAMES = {"M": "Men", "W": "Women", "X": "Other"}
+
+
+def histogram_table(df, values, bins):
+    values = np.asarray(values, dtype="float64")
+    valid = ~np.isnan(values)
+    groups = df[valid].groupby(HIST_KEYS, observed=True)
+    codes = groups.ngroup().to_numpy()
+    keys = groups.size().index.to_frame(index=False)
+
+    n = bins["count"]
+    idx = np.floor((values[valid] - bins["start"]) / bins["width"])
+    idx = np.clip(idx, 0, n - 1).astype("int64")
+    counts = np.bincount(codes * n + idx, minlength=len(keys) * n).reshape(len(keys), n)
+
+    # Stored long and sparse so partitions merge with a plain groupby-sum
+    group, bin_ = np.nonzero(counts)
+    table = keys.iloc[group].reset_index(drop=True)
+    table["bin"] = bin_
+    table["count"] = counts[group, bin_]
+    return table
+
+
+def dense_histograms(table, bins):
+    counts = table.pivot_table(
+        index=HIST_KEYS, columns="bin", values="count", aggfunc="sum", fill_value=0, observed=True
+    ).reindex(columns=range(bins["count"]), fill_value=0)
+    return {"keys": counts.index.to_frame(index=False), "counts": counts.to_numpy(), "bins": bins}
+
+
+def select_counts(store, **filters):
+    mask = np.ones(len(store["keys"]), dtype=bool)
+    for key, value in filters.items():
+        if value:
+            values = [value] if isinstance(value, str) else list(value)
+            mask &= store["keys"][key].isin(values).to_numpy()
+    return store["counts"][mask].sum(axis=0)
+
+
+def group_counts(store, by, **filters):
+    keys = store["keys"]
+    values = keys[by].drop_duplicates().sort_values()
+    selected = filters.get(by)
+    if selected:
+        # A filter on the grouping column keeps only the selected groups
+        values = values[values.isin([selected] if isinstance(selected, str) else selected)]
+    result = {}
+    for value in values:
+        result[value] = select_counts(store, **dict(filters, **{by: [value]}))
+    return result
+
+
+def bin_centers(bins):
+    return bins["start"] + (np.arange(bins["count"]) + 0.5) * bins["width"]
+
+
+def percentiles(counts, bins, qs=PERCENTILES):
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1] if len(cumulative) else 0
+    if total == 0:
+        return {q: np.nan for q in qs}
+    targets = np.asarray(qs, dtype="float64") / 100 * total
+    idx = np.minimum(np.searchsorted(cumulative, targets, side="left"), len(counts) - 1)
+    before = np.where(idx > 0, cumulative[idx - 1], 0)
+    # Linear interpolation inside the bin holding the target rank
+    fraction = (targets - before) / np.maximum(counts[idx], 1)
+    values = bins["start"] + (idx + fraction) * bins["width"]
+    return dict(zip(qs, values.round(2)))
+
+
+def summary_table(store, by, **filters):
+    rows = []
+    for value, counts in group_counts(store, by, **filters).items():
+        total = counts.sum()
+        if not total:
+            continue
+        mean = (counts * bin_centers(store["bins"])).sum() / total
+        row = {by: GROUP_NAMES.get(value, value), "runners": int(total), "mean": round(mean, 2)}
+        row.update({f"p{q}": v for q, v in percentiles(counts, store["bins"]).items()})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _color(value, i):
+    return GROUP_COLORS.get(value, px.colors.qualitative.Plotly[i % 10])
+
+
+def histogram_figure(store, by, label, **filters):
+    centers = bin_centers(store["bins"])
+    fig = go.Figure()
+    for i, (value, counts) in enumerate(group_counts(store, by, **filters).items()):
+        if counts.sum():
+            used = np.flatnonzero(counts)
+            span = slice(used[0], used[-1] + 1)
+            fig.add_bar(
+                x=centers[span].round(2),
+                y=(100 * counts[span] / counts.sum()).round(3),
+                name=GROUP_NAMES.get(value, value),
+                marker_color=_color(value, i),
+                opacity=0.6,
+            )
+    fig.update_layout(
+        barmode="overlay",
+        bargap=0,
+        xaxis=dict(title=label),
+        yaxis=dict(title="% of Runners"),
+        template="plotly_white",
+    )
+    return fig
+
+
+def violin_figure(store, by, label, **filters):
+    # Violins drawn from the bins: each group is a mirrored density outline
+    centers = bin_centers(store["bins"])
+    fig = go.Figure()
+    names = []
+    for i, (value, counts) in enumerate(group_counts(store, by, **filters).items()):
+        if not counts.sum():
+            continue
+        used = np.flatnonzero(counts)
+        span = slice(used[0], used[-1] + 1)
+        density = counts[span] / counts.max() * 0.4
+        y = centers[span]
+        position = len(names)
+        fig.add_scatter(
+            x=np.concatenate([position - density, (position + density)[::-1]]).round(3),
+            y=np.concatenate([y, y[::-1]]).round(2),
+            fill="toself",
+            mode="lines",
+            line=dict(color=_color(value, i), width=1),
+            name=GROUP_NAMES.get(value, value),
+            hoverinfo="skip",
+        )
+        median = percentiles(counts, store["bins"], [50])[50]
+        fig.add_scatter(
+            x=[position - 0.4, position + 0.4],
+            y=[median, median],
+            mode="lines",
+            line=dict(color="#000000", width=2),
+            showlegend=False,
+            hovertemplate=f"Median: {median}<extra></extra>",
+        )
+        names.append(GROUP_NAMES.get(value, value))
+    fig.update_layout(
+        xaxis=dict(tickvals=list(range(len(names))), ticktext=names, title=""),
+        yaxis=dict(title=label),
+        template="plotly_white",
+    )
+    return fig
@@ -0,0 +1,25 @@
+import gc
+import os
+import sys
+
+# Workers read the prepared results straight from the mapped cache file, so
+# the data pages are shared through the OS page cache (see data_cache.py and
+# load_store in results_store.py)
+os.environ.setdefault("MARATHON_SHARED_DATA", "1")
+
+wsgi_app = "app:server"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("WEB_CONCURRENCY", 8))
+# Import the app once in the master; workers inherit it copy-on-write
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    dashboard = sys.modules.get("app")
+    if dashboard is not None:
+        # Pre-fork warmup: build every tab once so workers inherit the figures
+        for tab in dashboard.tab_builders:
+            dashboard.tab_content(tab)
+    # Move everything loaded so far out of the collector's reach; otherwise
+    # the first GC pass in each worker writes to (and so copies) those pages
+    gc.freeze()
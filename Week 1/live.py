@@ -0,0 +1,167 @@
+import io
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from utils import (
+    combine_partials,
+    concat_frames,
+    empty_results,
+    finalize_aggregates,
+    partial_aggregates,
+    prepare_results,
+)
+
+logger = logging.getLogger(__name__)
+
+# A results CSV that keeps growing on race day, or a directory that finished
+# batches are dropped into; unset means the dashboard serves a fixed file
+LIVE_SOURCE = os.environ.get("MARATHON_LIVE_SOURCE")
+LIVE_INTERVAL_MS = int(os.environ.get("MARATHON_LIVE_INTERVAL_MS", "5000"))
+
+OVERVIEW_KEYS = ["age", "gender", "Country"]
+
+
+def overview_partial(df):
+    grouped = df.groupby(OVERVIEW_KEYS, observed=True)
+    return {
+        "runners": grouped.size().rename("count").reset_index(),
+        "pace": grouped["DecimalPace"].agg(["sum", "count"]).astype("float64").reset_index(),
+    }
+
+
+def add_counts(total, new):
+    # Both sides are grouped tables, so this costs the number of groups, not rows
+    keys = [c for c in new.columns if c not in ("count", "sum")]
+    return (
+        concat_frames([total, new], ignore_index=True)
+        .groupby(keys, observed=True)
+        .sum()
+        .reset_index()
+    )
+
+
+class LiveResults:
+    def __init__(self, source):
+        self.source = source
+        self.offset = 0
+        self.columns = None
+        self.seen = set()
+        empty = empty_results()
+        self.batches = [empty]
+        self.partial = partial_aggregates(empty)
+        self.overview = overview_partial(empty)
+        self.countries = pd.Series(dtype="int64")
+        self.genders = pd.Series(dtype="int64")
+        self.total = 0
+        self.version = 0
+        self.lock = threading.RLock()
+
+    # Each reader returns the new rows and the read position after them; the
+    # position is only taken once those rows are applied, so a chunk that
+    # fails to parse is read again on the next poll instead of being lost
+    def read_csv_tail(self):
+        # A source that doesn't exist yet just has no rows
+        if not os.path.exists(self.source):
+            return None, {}
+        size = os.path.getsize(self.source)
+        if size <= self.offset:
+            return None, {}
+        with open(self.source, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        # The writer may be halfway through a line; leave it for the next poll
+        end = chunk.rfind(b"\n") + 1
+        if not end:
+            return None, {}
+        if self.columns is None:
+            raw = pd.read_csv(io.BytesIO(chunk[:end]))
+        else:
+            raw = pd.read_csv(io.BytesIO(chunk[:end]), header=None, names=self.columns)
+        return raw, {"offset": self.offset + end, "columns": list(raw.columns)}
+
+    def read_queue(self):
+        # Producers should write under another name and rename into place so
+        # that a half-written batch is never picked up
+        names = sorted(
+            name
+            for name in os.listdir(self.source)
+            if name.endswith(".csv") and name not in self.seen
+        )
+        if not names:
+            return None, {}
+        raw = pd.concat(
+            [pd.read_csv(os.path.join(self.source, name)) for name in names],
+            ignore_index=True,
+        )
+        return raw, {"seen": self.seen | set(names)}
+
+    def read_new_rows(self):
+        if os.path.isdir(self.source):
+            return self.read_queue()
+        return self.read_csv_tail()
+
+    def apply(self, batch):
+        partial, overview = partial_aggregates(batch), overview_partial(batch)
+        self.partial = combine_partials([self.partial, partial])
+        for name, table in overview.items():
+            self.overview[name] = add_counts(self.overview[name], table)
+        self.countries = self.countries.add(
+            batch["countryCode"].value_counts(), fill_value=0
+        )
+        self.genders = self.genders.add(batch["gender"].value_counts(), fill_value=0)
+        self.total += len(batch)
+        self.batches.append(batch)
+
+    def poll(self, on_update=None):
+        # Several interval callbacks may fire at once; only one reads the
+        # source. on_update runs under the same lock before the new version is
+        # published, so no caller sees the version ahead of the data behind it
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            raw, position = self.read_new_rows()
+            if raw is None:
+                return False
+            batch = prepare_results(raw)
+            if not batch.empty:
+                self.apply(batch)
+            for name, value in position.items():
+                setattr(self, name, value)
+            if batch.empty:
+                return False
+            if on_update:
+                on_update()
+            self.version += 1
+            logger.info("Live results: %d new rows, %d total", len(batch), self.total)
+            return True
+        finally:
+            self.lock.release()
+
+    def kpis(self):
+        return {
+            "total_participants": self.total,
+            "total_nationalities": int((self.countries > 0).sum()),
+            "male_participants": int(self.genders.get("M", 0)),
+            "female_participants": int(self.genders.get("W", 0)),
+        }
+
+    def cube(self):
+        return finalize_aggregates(self.partial)
+
+    def runners_by_age(self):
+        return self.overview["runners"]
+
+    def avg_pace_by_age(self):
+        pace = self.overview["pace"]
+        return pace[OVERVIEW_KEYS].assign(DecimalPace=pace["sum"] / pace["count"])
+
+    def frame(self):
+        # Batches are only stitched together when the full frame is needed;
+        # rows are only ever appended, so positions into an older frame stay valid
+        with self.lock:
+            if len(self.batches) > 1:
+                self.batches = [concat_frames(self.batches, ignore_index=True)]
+            return self.batches[0]
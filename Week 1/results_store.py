@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Modules shared by both dashboards live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from data_cache import PIPELINE_VERSION, SHARED_DATA, read_cache
+from utils import (
+    apply_schema,
+    concat_frames,
+    empty_results,
+    merge_aggregates,
+    partial_aggregates,
+    prepare_results,
+)
+from common.file_cache import file_hash, write_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: only run one ingest at a time yourself
+    fcntl = None
+
+RESULTS_DIR = os.environ.get("MARATHON_RESULTS_DIR", "results")
+STORE_DIR = os.environ.get("MARATHON_STORE_DIR", "store")
+MANIFEST = "manifest.json"
+# Shared mode serves the store from one mapped Feather file per selection
+SHARED_PREFIX = "shared-"
+AGGREGATES = ["age", "country", "pace", "races", "pace_hist", "finish_hist"]
+FORK_AVAILABLE = "fork" in multiprocessing.get_all_start_methods()
+
+
+def parse_source_name(path):
+    # "NYC Marathon Results, 2024 - Marathon Runner Results.csv" -> ("nyc-marathon", 2024)
+    name = os.path.splitext(os.path.basename(path))[0]
+    year = re.search(r"(?:19|20)\d{2}", name)
+    if not year:
+        raise ValueError(f"No race year in file name: {name}")
+    race = re.split(r"\bresults\b|(?:19|20)\d{2}", name, flags=re.IGNORECASE)[0]
+    race = re.sub(r"[^a-z0-9]+", "-", race.lower()).strip("-") or "race"
+    return race, int(year.group())
+
+
+def partition_dir(store_dir, race, year):
+    return os.path.join(store_dir, f"race={race}", f"year={year}")
+
+
+def write_parquet(df, path):
+    write_cache(path, lambda tmp: df.to_parquet(tmp, index=False))
+
+
+def ingest_file(path, store_dir=STORE_DIR):
+    race, year = parse_source_name(path)
+    df = prepare_results(pd.read_csv(path))
+
+    target = partition_dir(store_dir, race, year)
+    write_parquet(df, os.path.join(target, "results.parquet"))
+    for name, table in partial_aggregates(df).items():
+        write_parquet(table, os.path.join(target, f"{name}.parquet"))
+    return {"race": race, "year": year, "rows": len(df)}
+
+
+def read_manifest(store_dir=STORE_DIR):
+    path = os.path.join(store_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, store_dir=STORE_DIR):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    write_cache(os.path.join(store_dir, MANIFEST), write)
+
+
+@contextmanager
+def ingest_lock(store_dir=STORE_DIR):
+    # gunicorn workers importing the app at once ingest one after another;
+    # those that waited find the manifest up to date and have nothing to do
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, ".ingest.lock"), "w") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def ingest_directory(results_dir=RESULTS_DIR, store_dir=STORE_DIR, workers=None):
+    with ingest_lock(store_dir):
+        return ingest_sources(results_dir, store_dir, workers)
+
+
+def ingest_sources(results_dir, store_dir, workers):
+    # workers=0 parses in-process; otherwise files are parsed in a process pool
+    manifest = read_manifest(store_dir)
+    sources = sorted(n for n in os.listdir(results_dir) if n.lower().endswith(".csv"))
+    removed = set(manifest) - set(sources)
+    for name in removed:
+        entry = manifest.pop(name)
+        target = partition_dir(store_dir, entry["race"], entry["year"])
+        shutil.rmtree(target, ignore_errors=True)
+        race_dir = os.path.dirname(target)
+        if os.path.isdir(race_dir) and not os.listdir(race_dir):
+            os.rmdir(race_dir)
+
+    pending = {}
+    for name in sources:
+        digest = file_hash(os.path.join(results_dir, name))
+        entry = manifest.get(name, {})
+        if entry.get("hash") != digest or entry.get("pipeline") != PIPELINE_VERSION:
+            pending[name] = digest
+
+    partitions = {}
+    for name in sources:
+        key = parse_source_name(name)
+        if key in partitions:
+            raise ValueError(f"{name} and {partitions[key]} map to the same race/year")
+        partitions[key] = name
+
+    paths = [os.path.join(results_dir, name) for name in pending]
+    if workers == 0:
+        results = [ingest_file(path, store_dir) for path in paths]
+    elif paths:
+        context = multiprocessing.get_context("fork") if FORK_AVAILABLE else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(ingest_file, paths, [store_dir] * len(paths)))
+    else:
+        results = []
+
+    for (name, digest), result in zip(pending.items(), results):
+        manifest[name] = dict(result, hash=digest, pipeline=PIPELINE_VERSION)
+    if pending or removed:
+        write_manifest(manifest, store_dir)
+        for name in os.listdir(store_dir):
+            if name.startswith(SHARED_PREFIX):
+                os.remove(os.path.join(store_dir, name))
+    return list(pending)
+
+
+def store_partitions(store_dir=STORE_DIR, races=None, years=None):
+    return sorted(
+        (entry["race"], entry["year"])
+        for entry in read_manifest(store_dir).values()
+        if (not races or entry["race"] in races)
+        and (not years or entry["year"] in years)
+    )
+
+
+def read_partitions(store_dir, partitions):
+    frames = []
+    for race, year in partitions:
+        path = os.path.join(partition_dir(store_dir, race, year), "results.parquet")
+        frames.append(pd.read_parquet(path).assign(race=race, year=year))
+    # An empty selection still has the prepared columns and dtypes
+    df = concat_frames(frames or [empty_results().assign(race=None, year=0)], ignore_index=True)
+    return apply_schema(df).astype({"race": "category", "year": "int16"})
+
+
+def shared_store_path(store_dir, partitions):
+    # Keyed on the manifest entries of the selection, so re-ingested or removed
+    # files never serve an old copy
+    entries = [
+        entry
+        for _, entry in sorted(read_manifest(store_dir).items())
+        if (entry["race"], entry["year"]) in partitions
+    ]
+    key = hashlib.sha256(json.dumps(entries, sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(store_dir, f"{SHARED_PREFIX}{key}.feather")
+
+
+def load_store(store_dir=STORE_DIR, races=None, years=None, shared=SHARED_DATA):
+    partitions = store_partitions(store_dir, races, years)
+    if not shared:
+        return read_partitions(store_dir, partitions)
+
+    import pyarrow.feather as feather
+
+    # Parquet partitions can't be mapped, so the selection is written once as
+    # uncompressed Feather that all workers map, as load_results does
+    path = shared_store_path(store_dir, partitions)
+    with ingest_lock(store_dir):
+        if not os.path.exists(path):
+            frame = read_partitions(store_dir, partitions)
+            write_cache(
+                path,
+                lambda tmp: feather.write_feather(frame, tmp, compression="uncompressed"),
+            )
+    return read_cache(path, shared=True)
+
+
+def load_store_aggregates(store_dir=STORE_DIR, races=None, years=None):
+    partials = []
+    for race, year in store_partitions(store_dir, races, years):
+        target = partition_dir(store_dir, race, year)
+        partials.append(
+            {
+                name: pd.read_parquet(os.path.join(target, f"{name}.parquet"))
+                for name in AGGREGATES
+            }
+        )
+    return merge_aggregates(partials)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest race results into the store")
+    parser.add_argument("results_dir", nargs="?", default=RESULTS_DIR)
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    ingested = ingest_directory(args.results_dir, args.store_dir, args.workers)
+    print(f"Ingested {len(ingested)} file(s): {', '.join(ingested) or '-'}")
+    for race, year in store_partitions(args.store_dir):
+        print(f"  {race} {year}")
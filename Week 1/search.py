@@ -0,0 +1,93 @@
+import bisect
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+SEARCH_FIELDS = ["firstName", "city", "stateProvince", "countryCode"]
+GRAM = 3
+# A term scores by how well it matches its best field
+EXACT, PREFIX, SUBSTRING = 3, 2, 1
+
+
+def _grams(text):
+    return {text[i : i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def _field_index(values):
+    codes, uniques = pd.factorize(values)
+    uniques = np.array([str(u).lower() for u in uniques], dtype=object)
+
+    tokens = sorted(
+        (token, i) for i, value in enumerate(uniques) for token in re.split(r"\W+", value) if token
+    )
+    grams = defaultdict(list)
+    for i, value in enumerate(uniques):
+        for gram in _grams(value):
+            grams[gram].append(i)
+
+    return {
+        "codes": codes,
+        "values": uniques,
+        "tokens": [t for t, _ in tokens],
+        "token_ids": np.array([i for _, i in tokens], dtype="int64"),
+        "grams": {g: np.array(ids, dtype="int64") for g, ids in grams.items()},
+    }
+
+
+def build_search_index(df, fields=SEARCH_FIELDS):
+    # Indexes the distinct values of each field, so it stays small even when
+    # hundreds of thousands of runners share a few thousand names and cities
+    return {field: _field_index(df[field]) for field in fields}
+
+
+def _term_scores(field, term):
+    scores = np.zeros(len(field["values"]), dtype="int8")
+
+    if len(term) >= GRAM:
+        candidates = None
+        for gram in _grams(term):
+            ids = field["grams"].get(gram)
+            if ids is None:
+                candidates = np.array([], dtype="int64")
+                break
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids)
+        hits = [i for i in candidates if term in field["values"][i]]
+        scores[hits] = SUBSTRING
+
+    start = bisect.bisect_left(field["tokens"], term)
+    end = bisect.bisect_left(field["tokens"], term + "￿")
+    scores[field["token_ids"][start:end]] = PREFIX
+    scores[field["values"] == term] = EXACT
+    return scores
+
+
+def search_rows(index, query):
+    # Positions of the matching rows in the indexed frame, best match first
+    terms = [t for t in re.split(r"\W+", (query or "").lower()) if t]
+    if not terms:
+        return np.array([], dtype="int64")
+
+    size = len(next(iter(index.values()))["codes"])
+    total = np.zeros(size, dtype="int16")
+    matched = np.ones(size, dtype=bool)
+    for term in terms:
+        best = np.zeros(size, dtype="int8")
+        for field in index.values():
+            scores = _term_scores(field, term)
+            # code -1 (missing value) picks the appended zero
+            np.maximum(best, np.append(scores, 0)[field["codes"]], out=best)
+        # Every term has to match some field
+        matched &= best > 0
+        total += best
+
+    matches = np.flatnonzero(matched)
+    # Best score first, then file order (i.e. finishing place)
+    order = np.lexsort((matches, -total[matches]))
+    return matches[order]
+
+
+def search_runners(df, index, query, limit=50):
+    rows = search_rows(index, query)
+    return df.iloc[rows if limit is None else rows[:limit]]
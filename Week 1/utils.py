@@ -0,0 +1,475 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+import plotly.graph_objects as go
+
+from distributions import FINISH_BINS, HIST_KEYS, PACE_BINS, histogram_table
+
+logger = logging.getLogger(__name__)
+
+
+def convert_str_to_time(string):
+    count = string.count(":")
+   
+    if count == 1:
+        if "." in string:
+            result = datetime.strptime(string, '%M:%S.%f')
+        else:
+            result = datetime.strptime(string, '%M:%S')
+    elif count == 2:
+        days_add= None
+        h, m, s = string.split(':')
+        if int(h)>=24:
+            days_add = int(h)//24
+        if days_add:
+            string = '00' + string[2:]
+            if "." in string:
+                result = datetime.strptime(string, '%H:%M:%S.%f') + relativedelta(days=days_add)
+            else:
+                result = datetime.strptime(string, '%H:%M:%S') + relativedelta(days=days_add)
+        elif "." in string:
+            result = datetime.strptime(string, '%H:%M:%S.%f')
+        else:
+            result = datetime.strptime(string, '%H:%M:%S')
+    midnight = result.replace(hour=0, minute=0, second=0, microsecond=0)
+    time_from_midnight = result - midnight
+    return round(time_from_midnight.total_seconds()/60, 2)
+
+
+# [H]H:MM:SS[.ffffff] or M:SS[.ffffff], the formats convert_str_to_time accepts
+DURATION_PATTERN = r"^(?:(\d{1,2}):)?(\d{1,2}):(\d{1,2})(?:\.(\d{1,6}))?$"
+
+
+def parse_durations(values):
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    if len(uniques) == 0:
+        return pd.Series(np.nan, index=values.index, dtype="float64")
+
+    parts = pd.Series(uniques).astype(str).str.extract(DURATION_PATTERN)
+    bad = parts[1].isna()
+    hours = parts[0].fillna("0").astype("int64").to_numpy()
+    minutes = parts[1].fillna("0").astype("int64").to_numpy()
+    seconds = parts[2].fillna("0").astype("int64").to_numpy()
+    micros = parts[3].fillna("").str.ljust(6, "0").astype("int64").to_numpy()
+    bad = bad.to_numpy() | (minutes > 59) | (seconds > 59)
+    if bad.any():
+        raise ValueError(f"Unparseable durations: {list(uniques[bad][:5])}")
+
+    # convert_str_to_time keeps only the time of day once hours roll past 24
+    hours = np.where(hours >= 24, 0, hours)
+    total_micros = ((hours * 60 + minutes) * 60 + seconds) * 1_000_000 + micros
+    # Rounded per distinct value with the builtin round so results match
+    # convert_str_to_time bit for bit (np.round can differ on ties)
+    rounded = np.array([round(m, 2) for m in (total_micros / 1e6 / 60).tolist()])
+
+    result = np.full(len(codes), np.nan)
+    valid = codes >= 0
+    result[valid] = rounded[codes[valid]]
+    return pd.Series(result, index=values.index)
+
+
+def convert_time_columns(df, columns=("pace", "overallTime", "ageGradeTime")):
+    return pd.DataFrame({c: parse_durations(df[c]) for c in columns}, index=df.index)
+
+
+def interval_labels(start, end, step, open_ended=True):
+    edges = list(np.arange(start, end, step)) + [end]
+    labels = [f"{lo:g}-{lo + step:g}" for lo in edges[:-1]]
+    if open_ended:
+        edges.append(np.inf)
+        labels.append(f"{end:g}+")
+    return np.asarray(edges, dtype="float64"), labels
+
+
+def bin_values(values, start, end, step, open_ended=True, unknown=None):
+    edges, labels = interval_labels(start, end, step, open_ended)
+    values = np.asarray(values, dtype="float64")
+    # Bucket k covers [edges[k], edges[k + 1]); misses land on -1 or len(labels)
+    codes = np.searchsorted(edges, values, side="right") - 1
+    missed = (codes < 0) | (codes >= len(labels)) | np.isnan(values)
+    if missed.any() and unknown is not None:
+        codes[missed] = len(labels)
+        labels = labels + [unknown]
+    else:
+        codes[missed] = -1
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+
+def get_age_group(age, start=10, end=90, step=10):
+    groups = bin_values(
+        np.atleast_1d(age), start, end, step, unknown="Unknown Age Group"
+    )
+    if np.ndim(age) == 0:
+        return groups[0]
+    return groups
+
+
+def get_pace_band(pace, start=5, end=20, step=1):
+    return bin_values(pace, start, end, step, unknown="Unknown Pace")
+
+
+def get_finish_time_band(minutes, start=120, end=420, step=30):
+    return bin_values(minutes, start, end, step, unknown="Unknown Time")
+
+
+filter_cols = [
+    "firstName",
+    "age",
+    "ageGroup",
+    "gender",
+    "city",
+    "countryCode",
+    "stateProvince",
+    "overallPlace",
+    "overallTime",
+    "pace",
+    "genderPlace",
+    "ageGradeTime",
+    "ageGradePlace",
+    "ageGradePercent",
+    "racesCount",
+]
+
+
+# Target dtypes for the prepared results frame; every gunicorn worker holds a copy
+RESULTS_DTYPES = {
+    "age": "int16",
+    "ageGroup": "category",
+    "gender": "category",
+    "city": "category",
+    "countryCode": "category",
+    "stateProvince": "category",
+    "overallPlace": "int32",
+    "genderPlace": "int32",
+    "ageGradePlace": "int32",
+    "ageGradePercent": "float32",
+    "racesCount": "int16",
+    "DecimalPace": "float32",
+    "FinishMinutes": "float32",
+    "Country": "category",
+}
+
+
+def apply_schema(df, dtypes=RESULTS_DTYPES):
+    return df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+
+
+def memory_report(df, dtypes=RESULTS_DTYPES):
+    before = df.memory_usage(deep=True)
+    after = apply_schema(df, dtypes).memory_usage(deep=True)
+    report = pd.DataFrame({"before": before, "after": after}).drop(index="Index")
+    report.loc["total"] = report.sum()
+    report["saved_pct"] = (100 * (1 - report["after"] / report["before"])).round(1)
+    return report
+
+
+def prepare_results(df, schema=True):
+    df["ageGroup"] = get_age_group(df["age"])
+    df = df[filter_cols]
+    df = df.dropna().reset_index(drop=True)
+    # Parsed once here so partitions and live batches never re-parse the clocks
+    minutes = convert_time_columns(df, ("pace", "overallTime"))
+    df = df.assign(
+        DecimalPace=minutes["pace"],
+        FinishMinutes=minutes["overallTime"],
+        Country=np.where(df["countryCode"] == "USA", "USA", "Abroad"),
+    )
+    return apply_schema(df) if schema else df
+
+
+def empty_results():
+    # The prepared frame's columns and dtypes, for a race with no results yet
+    return prepare_results(pd.DataFrame(columns=filter_cols))
+
+
+def partial_aggregates(df):
+    age = df.groupby(["ageGroup", "gender"], observed=True).size().reset_index(name="count")
+    country = (
+        df.groupby(["countryCode", "gender"], observed=True)
+        .size()
+        .reset_index(name="count")
+    )
+    pace = (
+        df.groupby(["ageGroup", "gender"], observed=True)["DecimalPace"]
+        .agg(["sum", "count"])
+        .astype("float64")
+        .reset_index()
+    )
+    races = df[["firstName", "racesCount", "gender"]]
+    races = races.sort_values(by="racesCount", ascending=True).tail(10)
+    pace_hist = histogram_table(df, df["DecimalPace"], PACE_BINS)
+    finish_hist = histogram_table(df, df["FinishMinutes"], FINISH_BINS)
+    return {
+        "age": age,
+        "country": country,
+        "pace": pace,
+        "races": races,
+        "pace_hist": pace_hist,
+        "finish_hist": finish_hist,
+    }
+
+
+def concat_frames(frames, **kwargs):
+    # pd.concat falls back to object columns when categoricals have different
+    # categories, so each frame is first given the union of them: sorted, so
+    # the grid still sorts alphabetically, or for ordered columns (ageGroup)
+    # the first frame's order with any new categories after it
+    frames = list(frames)
+    dtypes = {}
+    for column in frames[0].columns:
+        series = [f[column] for f in frames if column in f]
+        if not all(isinstance(s.dtype, pd.CategoricalDtype) for s in series):
+            continue
+        first = series[0].dtype
+        if first.ordered:
+            categories = first.categories
+            for s in series[1:]:
+                categories = categories.append(s.cat.categories.difference(categories, sort=False))
+            dtypes[column] = pd.CategoricalDtype(categories, ordered=True)
+        else:
+            categories = union_categoricals(
+                [s.cat.as_unordered() for s in series], sort_categories=True
+            ).categories
+            dtypes[column] = pd.CategoricalDtype(categories)
+    frames = [f.astype({c: t for c, t in dtypes.items() if c in f}) for f in frames]
+    return pd.concat(frames, **kwargs)
+
+
+def combine_partials(partials):
+    # Partials come from one results partition (race/year) or one batch of
+    # live results each; counts and pace sums add up, top-N tables are
+    # re-ranked over the union
+    def combine(name, keys):
+        return (
+            concat_frames([p[name] for p in partials], ignore_index=True)
+            .groupby(keys, observed=True)
+            .sum()
+            .reset_index()
+        )
+
+    races = concat_frames([p["races"] for p in partials])
+    races = races.sort_values(by="racesCount", ascending=True, kind="stable").tail(10)
+
+    return {
+        "age": combine("age", ["ageGroup", "gender"]),
+        "country": combine("country", ["countryCode", "gender"]),
+        "pace": combine("pace", ["ageGroup", "gender"]),
+        "races": races,
+        "pace_hist": combine("pace_hist", HIST_KEYS + ["bin"]),
+        "finish_hist": combine("finish_hist", HIST_KEYS + ["bin"]),
+    }
+
+
+def finalize_aggregates(partial):
+    country = partial["country"].sort_values(by="count", ascending=False)
+    country = country[
+        country["countryCode"].isin(country["countryCode"].unique()[:10])
+    ].reset_index(drop=True)
+
+    pace = partial["pace"].copy()
+    pace["AvgPace"] = pace["sum"] / pace["count"]
+    pace = pace[["ageGroup", "gender", "AvgPace"]]
+
+    return {**partial, "country": country, "pace": pace}
+
+
+def merge_aggregates(partials):
+    partials = list(partials) or [partial_aggregates(empty_results())]
+    return finalize_aggregates(combine_partials(partials))
+
+
+def build_aggregate_cube(df):
+    return merge_aggregates([partial_aggregates(df)])
+
+
+def filter_gender(data, gender=None):
+    if gender:
+        if isinstance(gender, (list, tuple)):
+            return data[data["gender"].isin(gender)]
+        elif isinstance(gender, str):
+            return data[data["gender"] == gender]
+    return data
+
+
+def normalize_gender(gender):
+    if not gender:
+        return ()
+    if isinstance(gender, str):
+        return (gender,)
+    return tuple(sorted(set(gender)))
+
+
+def _text_condition(series, condition):
+    kind = condition.get("type")
+    if kind == "blank":
+        return series.isna()
+    if kind == "notBlank":
+        return series.notna()
+    text = series.astype(str).str.lower()
+    value = str(condition.get("filter", "")).lower()
+    if kind == "equals":
+        return text == value
+    if kind == "notEqual":
+        return text != value
+    if kind == "startsWith":
+        return text.str.startswith(value)
+    if kind == "endsWith":
+        return text.str.endswith(value)
+    if kind == "notContains":
+        return ~text.str.contains(value, regex=False)
+    return text.str.contains(value, regex=False)
+
+
+def _number_condition(series, condition):
+    kind = condition.get("type")
+    value = condition.get("filter")
+    if kind == "blank":
+        return series.isna()
+    if kind == "notBlank":
+        return series.notna()
+    if kind == "notEqual":
+        return series != value
+    if kind == "lessThan":
+        return series < value
+    if kind == "lessThanOrEqual":
+        return series <= value
+    if kind == "greaterThan":
+        return series > value
+    if kind == "greaterThanOrEqual":
+        return series >= value
+    if kind == "inRange":
+        # Like the grid's own number filter, both ends of the range are excluded
+        return (series > value) & (series < condition.get("filterTo"))
+    return series == value
+
+
+def filter_mask(df, filter_model):
+    mask = pd.Series(True, index=df.index)
+    for column, model in (filter_model or {}).items():
+        condition = (
+            _number_condition
+            if model.get("filterType") == "number"
+            else _text_condition
+        )
+        conditions = model.get("conditions") or [
+            c for c in (model.get("condition1"), model.get("condition2")) if c
+        ]
+        if conditions:
+            masks = [condition(df[column], c) for c in conditions]
+            combined = masks[0]
+            for m in masks[1:]:
+                combined = combined | m if model.get("operator") == "OR" else combined & m
+        else:
+            combined = condition(df[column], model)
+        mask &= combined
+    return mask
+
+
+def apply_sort_model(df, sort_model):
+    if not sort_model:
+        return df
+    return df.sort_values(
+        by=[s["colId"] for s in sort_model],
+        ascending=[s["sort"] == "asc" for s in sort_model],
+        kind="stable",
+    )
+
+
+VIEW_CACHE_SIZE = 16
+_view_cache = OrderedDict()
+_view_cache_lock = threading.Lock()
+
+
+def view_positions(df, filter_model, sort_model, rows=None):
+    # rows limits the view to a subset of df in a given order (e.g. search hits);
+    # only the filter and sort columns of those rows are copied
+    positions = np.arange(len(df)) if rows is None else np.asarray(rows)
+    if filter_model:
+        keys = df[list(filter_model)].iloc[positions]
+        positions = positions[filter_mask(keys, filter_model).to_numpy()]
+    if sort_model:
+        columns = list(dict.fromkeys(s["colId"] for s in sort_model))
+        keys = df[columns].iloc[positions].reset_index(drop=True)
+        positions = positions[apply_sort_model(keys, sort_model).index.to_numpy()]
+    return positions
+
+
+def get_rows_block(df, request, view_key=None, version=0, rows=None):
+    # The row positions of each filtered/sorted view are kept while users scroll
+    # through its blocks; callers bump version whenever df is replaced
+    filter_model, sort_model = request.get("filterModel"), request.get("sortModel")
+    key = (version, view_key, repr((filter_model, sort_model)))
+    with _view_cache_lock:
+        positions = _view_cache.get(key)
+        if positions is not None:
+            _view_cache.move_to_end(key)
+    if positions is None:
+        positions = view_positions(df, filter_model, sort_model, rows)
+        with _view_cache_lock:
+            _view_cache[key] = positions
+            while len(_view_cache) > VIEW_CACHE_SIZE:
+                _view_cache.popitem(last=False)
+    block = df.iloc[positions[request["startRow"] : request["endRow"]]]
+    return {"rowData": to_records(block), "rowCount": len(positions)}
+
+
+def to_records(df):
+    # float32 columns are widened so the grid shows 55.3 rather than 55.29999923
+    floats = df.select_dtypes(include="float32").columns
+    df = df.astype({c: "float64" for c in floats}).round({c: 2 for c in floats})
+    return df.to_dict("records")
+
+
+WEBGL_POINT_THRESHOLD = 1_000
+FIGURE_FLOAT_DECIMALS = 2
+FIGURE_BYTES_BUDGET = 1_000_000
+
+
+def _quantize(values, decimals):
+    if values is None:
+        return values
+    array = np.asarray(values)
+    if array.dtype.kind == "f":
+        return np.round(array.astype("float64"), decimals)
+    return values
+
+
+def optimize_figure(
+    fig,
+    name,
+    threshold=WEBGL_POINT_THRESHOLD,
+    decimals=FIGURE_FLOAT_DECIMALS,
+    budget=FIGURE_BYTES_BUDGET,
+):
+    traces = []
+    for trace in fig.data:
+        props = trace.to_plotly_json()
+        for key in ("x", "y", "customdata"):
+            if key in props:
+                props[key] = _quantize(props[key], decimals)
+        if "size" in props.get("marker", {}):
+            props["marker"]["size"] = _quantize(props["marker"]["size"], decimals)
+        if props.get("type") == "scatter" and len(props.get("x", ())) > threshold:
+            props.pop("type")
+            trace = go.Scattergl(props, skip_invalid=True)
+        else:
+            trace = type(trace)(props)
+        traces.append(trace)
+    fig = go.Figure(data=traces, layout=fig.layout)
+
+    size = len(fig.to_json())
+    if size > budget:
+        # Dropping points would misstate the per-age counts, so the figure is
+        # kept whole and the overrun is left for the logs
+        logger.warning(
+            "Figure %s is %d bytes, over its %d byte budget", name, size, budget
+        )
+    logger.info("Figure %s: %d bytes", name, size)
+    return fig
@@ -0,0 +1,228 @@
+import argparse
+import datetime
+import json
+import os
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+
+import plotly
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+WEEK1 = os.path.join(ROOT, "Week 1")
+WEEK2 = os.path.join(ROOT, "week2")
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+class Report:
+    def __init__(self, app):
+        self.app = app
+        self.stages = {}
+
+    def stage(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.record(name, time.perf_counter() - start)
+        return result
+
+    def record(self, name, seconds, response_bytes=None):
+        entry = {"wall_s": round(seconds, 4), "peak_rss_mb": peak_rss_mb()}
+        if response_bytes is not None:
+            entry["response_bytes"] = response_bytes
+        self.stages[name] = entry
+
+
+def to_json(component):
+    return json.dumps(component, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def serialize(report, name, component):
+    start = time.perf_counter()
+    size = len(to_json(component))
+    report.record(name, time.perf_counter() - start, size)
+
+
+def call_callback(client, outputs, inputs, state=()):
+    output_ids = [f"{i}.{p}" for i, p in outputs]
+    payload = {
+        "output": output_ids[0] if len(outputs) == 1 else f"..{'...'.join(output_ids)}..",
+        "outputs": [{"id": i, "property": p} for i, p in outputs],
+        "inputs": [{"id": i, "property": p, "value": v} for i, p, v in inputs],
+        "state": [{"id": i, "property": p, "value": v} for i, p, v in state],
+        "changedPropIds": [f"{i}.{p}" for i, p, _ in inputs[:1]],
+    }
+    if len(outputs) == 1:
+        payload["outputs"] = payload["outputs"][0]
+    response = client.post("/_dash-update-component", json=payload)
+    if response.status_code not in (200, 204):
+        raise RuntimeError(f"{payload['output']}: HTTP {response.status_code}")
+    return response
+
+
+def timed_request(report, name, func, *args):
+    start = time.perf_counter()
+    response = func(*args)
+    with response:
+        size = len(response.get_data())
+    report.record(name, time.perf_counter() - start, size)
+    return response
+
+
+def run_week1(rows):
+    # update_gender is timed as a server round trip; the payload the
+    # clientside mode ships instead is recorded as clientside_dem_figures
+    os.environ["MARATHON_CLIENTSIDE_FILTER"] = "0"
+    sys.path.insert(0, WEEK1)
+    workdir = tempfile.mkdtemp(prefix="week1-bench-")
+    os.chdir(workdir)
+
+    from fixtures import write_marathon_csv
+    import pandas as pd
+
+    report = Report("week1")
+    source = write_marathon_csv(
+        os.path.join(workdir, "NYC Marathon Results, 2024 - Marathon Runner Results.csv"),
+        rows,
+    )
+    import utils
+
+    raw = report.stage("load", pd.read_csv, source)
+    report.stage("derive", utils.prepare_results, raw)
+
+    module = report.stage("import_app", runpy.run_path, os.path.join(WEEK1, "app.py"))
+    serialize(report, "layout", module["app"].layout)
+    for tab in ("ov", "dem", "tabular"):
+        content = report.stage(f"figures_{tab}", module["tab_content"], tab)
+        serialize(report, f"layout_{tab}", content)
+
+    serialize(report, "clientside_dem_figures", list(module["gender_figures"](())))
+
+    client = module["app"].server.test_client()
+    figures = [("age_group_fig", "figure"), ("country_group_fig", "figure"),
+               ("avg_pace_fig", "figure"), ("race_fig", "figure")]
+    for label, gender in (("all", None), ("men", ["M"]), ("men_cached", ["M"])):
+        timed_request(
+            report, f"update_gender_{label}", call_callback, client, figures,
+            [("gender-select", "value", gender)],
+        )
+    for fmt in ("csv", "csv.gz", "parquet"):
+        response = call_callback(
+            client, [("export-url", "data")], [("export-btn", "n_clicks", 1)],
+            [("export-format", "value", fmt), ("gender-store", "data", ["W"])],
+        )
+        href = response.get_json()["response"]["export-url"]["data"]
+        timed_request(report, f"export_dataframe_{fmt}", client.get, href)
+    return report
+
+
+def run_week2():
+    sys.path.insert(0, WEEK2)
+    os.chdir(WEEK2)
+    import pandas as pd
+
+    report = Report("week2")
+    source = os.path.join(WEEK2, "sample_with_coordinates.xlsx")
+    report.stage("load", pd.read_excel, source)
+
+    # Time the cold path: without a cache the app parses the workbook itself
+    os.environ["PLASTICLIST_CACHE_DIR"] = tempfile.mkdtemp(prefix="week2-bench-")
+    module = report.stage("import_app", runpy.run_path, os.path.join(WEEK2, "app.py"))
+
+    serialize(report, "layout", module["app"].layout)
+    for tab in ("supchain", "category", "expiration"):
+        content = report.stage(f"figures_{tab}", module["tab_content"], tab)
+        serialize(report, f"layout_{tab}", content)
+    # Expiration charts are rendered per reference date by a callback
+    today = datetime.date.today()
+    report.stage("figures_expiration_today", module["expiration_figures"], today)
+    serialize(report, "layout_expiration_today", module["get_expiration_children"](today))
+
+    client = module["app"].server.test_client()
+    product = "Whole Foods Organic Broccoli"
+    response = timed_request(
+        report, "load_sample_id_options", call_callback, client,
+        [("id-dropdown", "data"), ("id-dropdown", "value")],
+        [("product-dropdown", "value", product)],
+    )
+    sample_id = response.get_json()["response"]["id-dropdown"]["value"]
+    timed_request(
+        report, "load_test_results", call_callback, client,
+        [("test-results-fig", "figure")],
+        [("product-dropdown", "value", product), ("id-dropdown", "value", sample_id),
+         ("unit-dropdown", "value", "ng_g")],
+    )
+    for fmt in ("csv", "csv.gz", "parquet"):
+        response = call_callback(
+            client, [("export-url", "data")], [("export-btn", "n_clicks", 1)],
+            [("export-format", "value", fmt), ("product-store", "data", None)],
+        )
+        href = response.get_json()["response"]["export-url"]["data"]
+        timed_request(report, f"export_dataframe_{fmt}", client.get, href)
+    return report
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    for app, stages in current["apps"].items():
+        before = previous.get("apps", {}).get(app, {})
+        for name, entry in stages.items():
+            if name not in before:
+                continue
+            for metric in ("wall_s", "peak_rss_mb", "response_bytes"):
+                old, new = before[name].get(metric), entry.get(metric)
+                if old and new is not None:
+                    change = 100 * (new - old) / old
+                    print(f"{app:>6} {name:<28} {metric:<15} {old:>12} -> {new:<12} {change:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark both dashboards")
+    parser.add_argument("--rows", type=int, default=55_000, help="Week 1 fixture size")
+    parser.add_argument("--output", default="benchmark-report.json")
+    parser.add_argument("--compare", help="previous report to diff against")
+    parser.add_argument("--app", choices=["week1", "week2"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.app:
+        # Each dashboard runs in its own process so peak RSS is not shared
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        report = run_week1(args.rows) if args.app == "week1" else run_week2()
+        print(json.dumps(report.stages))
+        return
+
+    apps = {}
+    for app in ("week1", "week2"):
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), "--app", app, "--rows", str(args.rows)],
+            text=True,
+        )
+        apps[app] = json.loads(output.strip().splitlines()[-1])
+
+    result = {"revision": git_revision(), "rows": args.rows, "apps": apps}
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
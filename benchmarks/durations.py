@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Week 1"))
+
+from utils import convert_str_to_time, parse_durations
+
+
+def sample_durations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(4 * 60, 30 * 60, n)
+    pace = pd.Series([f"{s // 60}:{s % 60:02d}" for s in seconds])
+    seconds = rng.integers(2 * 3600, 26 * 3600, n)
+    overall = pd.Series(
+        [f"{s // 3600}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds]
+    )
+    fraction = pd.Series(
+        [f"{s // 60 % 60}:{s % 60:02d}.{s % 100}" for s in seconds]
+    )
+    return {"pace": pace, "overallTime": overall, "fractional": fraction}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(n=55_000):
+    print(f"{'column':<12} {'apply (s)':>10} {'vectorized (s)':>15} {'speedup':>8}")
+    for name, values in sample_durations(n).items():
+        old, old_time = timed(values.apply, convert_str_to_time)
+        new, new_time = timed(parse_durations, values)
+        assert old.equals(new), f"{name}: results differ"
+        print(f"{name:<12} {old_time:>10.3f} {new_time:>15.3f} {old_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 55_000)
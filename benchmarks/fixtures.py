@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+FIRST_NAMES = ["Ann", "Bob", "Carl", "Dee", "Eve", "Femi", "Gus", "Hana", "Ivan", "Jo"]
+CITIES = ["New York", "Brooklyn", "Paris", "London", "Boston", "Milan", "Tokyo", None]
+COUNTRIES = ["USA", "FRA", "GBR", "ITA", "MEX", "DEU", "JPN", "BRA", "CAN", "ESP", "NLD", "AUS"]
+STATES = ["NY", "NJ", "CA", "MA", "-", None]
+
+
+def _clock(seconds):
+    return [f"{s // 3600}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds]
+
+
+def marathon_results(n=55_000, seed=0):
+    rng = np.random.default_rng(seed)
+    finish = rng.integers(2 * 3600, 8 * 3600, n)
+    pace = (finish / 26.2).astype(int)
+    return pd.DataFrame(
+        {
+            "runnerId": np.arange(n),
+            "firstName": rng.choice(FIRST_NAMES, n),
+            "bib": np.arange(1, n + 1),
+            "age": rng.integers(18, 85, n),
+            "gender": rng.choice(["M", "W", "X"], n, p=[0.55, 0.44, 0.01]),
+            "city": rng.choice(CITIES, n),
+            "countryCode": rng.choice(COUNTRIES, n),
+            "stateProvince": rng.choice(STATES, n),
+            "overallPlace": np.arange(1, n + 1),
+            "overallTime": _clock(np.sort(finish)),
+            "pace": [f"{p // 60}:{p % 60:02d}" for p in pace],
+            "genderPlace": rng.integers(1, n, n),
+            "ageGradeTime": _clock((finish * 0.9).astype(int)),
+            "ageGradePlace": rng.integers(1, n, n),
+            "ageGradePercent": rng.uniform(30, 90, n).round(2),
+            "racesCount": rng.integers(1, 60, n),
+        }
+    )
+
+
+def write_marathon_csv(path, n=55_000, seed=0):
+    marathon_results(n, seed).to_csv(path, index=False)
+    return path
+
+
+def sample_timelines(n=10_000, products=500, seed=0):
+    rng = np.random.default_rng(seed)
+    manufactured = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 540, n), unit="D")
+    collected = manufactured + pd.to_timedelta(rng.integers(0, 120, n), unit="D")
+    shipped = collected + pd.to_timedelta(rng.integers(0, 14, n), unit="D")
+    arrived = shipped + pd.to_timedelta(rng.integers(1, 7, n), unit="D")
+    return pd.DataFrame(
+        {
+            "product_truncated": rng.choice([f"Product {i:04d}" for i in range(products)], n),
+            "manufacturing_date": manufactured,
+            "collected_on": collected,
+            "shipped_on": shipped,
+            "arrived_at_lab_on": arrived,
+        }
+    )
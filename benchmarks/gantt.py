@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+
+import pandas as pd
+import plotly.figure_factory as ff
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "week2"))
+
+from fixtures import sample_timelines
+from utils import get_product_timeline_gantt
+
+
+def create_gantt_reference(df):
+    # The previous implementation: three dicts per row, then ff.create_gantt
+    gantt_data = []
+    for _, row in df.iterrows():
+        for stage, (start, finish) in (
+            ("Manufacturing to Collection", ("manufacturing_date", "collected_on")),
+            ("Collection to Shipment", ("collected_on", "shipped_on")),
+            ("Shipment to Arrival", ("shipped_on", "arrived_at_lab_on")),
+        ):
+            gantt_data.append(
+                {
+                    "Task": row["product_truncated"],
+                    "Start": row[start],
+                    "Finish": row[finish],
+                    "Stage": stage,
+                }
+            )
+    gantt_df = pd.DataFrame(gantt_data)
+    return ff.create_gantt(
+        gantt_df,
+        index_col="Stage",
+        show_colorbar=True,
+        group_tasks=True,
+        height=max(600, 40 * gantt_df["Task"].nunique()),
+    )
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(sizes, reference_limit=10_000):
+    print(f"{'samples':>8} {'create_gantt (s)':>17} {'bar traces (s)':>15} {'speedup':>8}")
+    for n in sizes:
+        df = sample_timelines(n)
+        (fig, _), new_time = timed(get_product_timeline_gantt, df)
+        bars = sum(len(trace.x) for trace in fig.data)
+        assert bars == 3 * n, f"{n}: expected {3 * n} bars, got {bars}"
+        if n > reference_limit:
+            print(f"{n:>8} {'-':>17} {new_time:>15.3f} {'-':>8}")
+            continue
+        _, old_time = timed(create_gantt_reference, df)
+        print(f"{n:>8} {old_time:>17.3f} {new_time:>15.3f} {old_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 50_000, 200_000]
+    main(sizes)
@@ -0,0 +1,94 @@
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Week 1"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from data_cache import build_cache, cache_path, load_results
+from fixtures import write_marathon_csv
+from utils import build_aggregate_cube
+
+MODES = {
+    "private": "every worker holds its own copy of the frame",
+    "shared": "every worker maps the Feather cache read-only",
+    "preload": "the master loads the frame, gc.freeze()s and forks",
+}
+
+
+def memory_kb():
+    # Pss splits shared pages between the processes mapping them
+    stats = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                stats[key.lower()] = int(value.split()[0])
+    return stats
+
+
+def worker(mode, source, cache_dir, preloaded, ready, done, results):
+    if mode == "preload":
+        df = preloaded
+    else:
+        df = load_results(source, cache_dir, shared=mode == "shared")
+    # Touch the data the way the dashboard does
+    build_aggregate_cube(df)
+    ready.wait()
+    results.put(memory_kb())
+    done.wait()
+
+
+def measure(mode, workers, source, cache_dir):
+    context = multiprocessing.get_context("fork")
+    preloaded = None
+    if mode == "preload":
+        preloaded = load_results(source, cache_dir, shared=False)
+        gc.freeze()
+    ready, done = context.Barrier(workers), context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(mode, source, cache_dir, preloaded, ready, done, results),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    stats = [results.get() for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+    gc.unfreeze()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory with and without sharing")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=55_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="worker-memory-")
+    source = write_marathon_csv(os.path.join(workdir, "results.csv"), args.rows)
+    cache_dir = os.path.join(workdir, ".cache")
+    if not os.path.exists(cache_path(source, cache_dir)):
+        build_cache(source, cache_dir)
+
+    print(f"{args.workers} workers, {args.rows} runners")
+    print(f"{'mode':<8} {'RSS/worker MB':>14} {'PSS/worker MB':>14} {'PSS total MB':>13}")
+    for mode, description in MODES.items():
+        stats = measure(mode, args.workers, source, cache_dir)
+        rss = sum(s["rss"] for s in stats) / len(stats) / 1024
+        pss = sum(s["pss"] for s in stats) / 1024
+        print(f"{mode:<8} {rss:>14.1f} {pss / len(stats):>14.1f} {pss:>13.1f}  ({description})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import io
+import threading
+import zlib
+
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "csv.gz": ("application/gzip", ".csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+EXPORT_CHUNK_ROWS = 10_000
+MAX_CONCURRENT_EXPORTS = 2
+export_slots = threading.BoundedSemaphore(MAX_CONCURRENT_EXPORTS)
+
+
+def stream_csv(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    yield df.iloc[:0].to_csv(index=False).encode()
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start : start + chunk_rows]
+        yield chunk.to_csv(index=False, header=False).encode()
+
+
+def stream_csv_gzip(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for data in stream_csv(df, chunk_rows):
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def stream_parquet(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Mixed-type object columns (e.g. "<LOQ" next to numbers) are written as text
+    text_cols = df.select_dtypes(include="object").columns
+    schema = pa.Schema.from_pandas(
+        df.iloc[:0].astype({c: "string" for c in text_cols}), preserve_index=False
+    )
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start : start + chunk_rows]
+            chunk = chunk.astype({c: "string" for c in text_cols})
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+            yield sink.drain()
+    yield sink.drain()
+
+
+export_writers = {
+    "csv": stream_csv,
+    "csv.gz": stream_csv_gzip,
+    "parquet": stream_parquet,
+}
+
+
+def export_response(df, fmt, filename):
+    if fmt not in EXPORT_FORMATS:
+        return Response(f"Unsupported export format: {fmt}", status=400)
+    if not export_slots.acquire(blocking=False):
+        return Response("Too many exports in progress, try again shortly.", status=429)
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    response = Response(
+        stream_with_context(export_writers[fmt](df)),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}{extension}"'
+        },
+    )
+    # Released when the response is closed, even if the client disconnects early
+    response.call_on_close(export_slots.release)
+    return response
+
+
+# Fetches an /export URL and saves the body under the server's file name. Errors
+# (bad format, too many exports) come back as text for the page to show, so the
+# dashboard is never replaced by an error response
+DOWNLOAD_EXPORT_JS = """
+function (url) {
+    if (!url) {
+        return window.dash_clientside.no_update;
+    }
+    return fetch(url)
+        .then(function (response) {
+            if (!response.ok) {
+                return response.text();
+            }
+            const disposition = response.headers.get("Content-Disposition") || "";
+            const match = disposition.match(/filename="([^"]+)"/);
+            return response.blob().then(function (blob) {
+                const link = document.createElement("a");
+                link.href = URL.createObjectURL(blob);
+                link.download = match ? match[1] : "export";
+                document.body.appendChild(link);
+                link.click();
+                link.remove();
+                setTimeout(function () {
+                    URL.revokeObjectURL(link.href);
+                }, 0);
+                return "";
+            });
+        })
+        .catch(function (error) {
+            return "Export failed: " + error.message;
+        });
+}
+"""
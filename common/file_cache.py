@@ -0,0 +1,61 @@
+import argparse
+import hashlib
+import os
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_stem(source):
+    return os.path.splitext(os.path.basename(source))[0].replace(" ", "_")
+
+
+def cache_path(source, cache_dir, version, extension):
+    # Keyed on the source's content and the pipeline version, so an edited
+    # file or a changed pipeline never reads an old cache
+    key = file_hash(source)[:16]
+    return os.path.join(cache_dir, f"{cache_stem(source)}-{key}-v{version}{extension}")
+
+
+def write_cache(path, write):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # The temporary name is per process so workers starting together don't
+    # clobber each other
+    tmp = f"{path}.{os.getpid()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def clear_cache(source, cache_dir, extension):
+    if not os.path.isdir(cache_dir):
+        return []
+    stem = source and cache_stem(source)
+    removed = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(extension) and (not stem or name.startswith(stem + "-")):
+            os.remove(os.path.join(cache_dir, name))
+            removed.append(name)
+    return removed
+
+
+def cache_cli(description, source, cache_dir, build, clear, path, report):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("command", choices=["rebuild", "clear", "report"])
+    parser.add_argument("source", nargs="?", default=source)
+    parser.add_argument("--cache-dir", default=cache_dir)
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        clear(args.source, args.cache_dir)
+        df = build(args.source, args.cache_dir)
+        print(f"Cached {len(df)} rows to {path(args.source, args.cache_dir)}")
+    elif args.command == "clear":
+        for name in clear(args.source, args.cache_dir):
+            print(f"Removed {name}")
+    else:
+        report(args.source, args.cache_dir)
@@ -0,0 +1,171 @@
+import bisect
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+
+from dash.exceptions import PreventUpdate
+from flask import Response
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+# Fraction of callback calls run under cProfile; the slowest profiles are kept
+PROFILE_SAMPLE_RATE = float(os.environ.get("DASH_PROFILE_SAMPLE_RATE", "0"))
+PROFILES_KEPT = int(os.environ.get("DASH_PROFILES_KEPT", "5"))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+
+class CallbackMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self.errors = defaultdict(int)
+        self.prevented = defaultdict(int)
+        self.profiles = defaultdict(list)
+
+    def record(self, callback_id, seconds, size=None, error=False, prevented=False):
+        with self.lock:
+            self.latency[callback_id].observe(seconds)
+            if size is not None:
+                self.size[callback_id].observe(size)
+            if error:
+                self.errors[callback_id] += 1
+            if prevented:
+                self.prevented[callback_id] += 1
+
+    def keep_profile(self, callback_id, seconds, profile):
+        with self.lock:
+            kept = self.profiles[callback_id]
+            if len(kept) < PROFILES_KEPT or seconds > kept[-1][0]:
+                text = io.StringIO()
+                pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(25)
+                kept.append((seconds, text.getvalue()))
+                kept.sort(key=lambda p: p[0], reverse=True)
+                del kept[PROFILES_KEPT:]
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            series = [
+                ("dash_callback_duration_seconds", "histogram", "Callback latency", self.latency),
+                ("dash_callback_response_bytes", "histogram", "Serialized callback output size", self.size),
+                ("dash_callback_errors_total", "counter", "Callbacks that raised", self.errors),
+                ("dash_callback_prevented_total", "counter", "Callbacks that raised PreventUpdate", self.prevented),
+            ]
+            for name, kind, description, values in series:
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+                for callback_id, value in sorted(values.items()):
+                    labels = f'callback="{escape_label(callback_id)}"'
+                    if kind == "histogram":
+                        lines.extend(value.lines(name, labels))
+                    else:
+                        lines.append(f"{name}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def profile_report(self):
+        with self.lock:
+            return "\n".join(
+                f"== {callback_id} ({seconds * 1000:.1f} ms)\n{text}"
+                for callback_id, kept in sorted(self.profiles.items())
+                for seconds, text in kept
+            )
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Only one profiler can be active at a time (Python 3.12+ raises ValueError
+# otherwise), so calls that overlap a profiled one simply run unprofiled
+_profile_lock = threading.Lock()
+
+
+def start_profile():
+    if random.random() >= PROFILE_SAMPLE_RATE or not _profile_lock.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:  # another tool's profiler is running
+        _profile_lock.release()
+        return None
+    return profile
+
+
+def stop_profile(profile):
+    profile.disable()
+    _profile_lock.release()
+
+
+def instrumented(callback_id, func, metrics):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = start_profile()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except PreventUpdate:
+            metrics.record(callback_id, time.perf_counter() - start, prevented=True)
+            raise
+        except Exception:
+            metrics.record(callback_id, time.perf_counter() - start, error=True)
+            raise
+        finally:
+            if profile:
+                stop_profile(profile)
+        seconds = time.perf_counter() - start
+        # Dash callbacks return their output already serialized to JSON
+        size = len(result) if isinstance(result, (str, bytes)) else None
+        metrics.record(callback_id, seconds, size)
+        if profile:
+            metrics.keep_profile(callback_id, seconds, profile)
+        return result
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument(app, metrics=None):
+    metrics = metrics or CallbackMetrics()
+
+    # Dash fills app.callback_map on the first request, so wrap lazily
+    @app.server.before_request
+    def wrap_callbacks():
+        for callback_id, entry in app.callback_map.items():
+            func = entry.get("callback")
+            if func is not None and not getattr(func, "instrumented", False):
+                entry["callback"] = instrumented(callback_id, func, metrics)
+
+    @app.server.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+    @app.server.route("/metrics/profiles")
+    def slowest_profiles():
+        return Response(metrics.profile_report(), mimetype="text/plain")
+
+    return metrics
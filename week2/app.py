@@ -2,77 +2,203 @@ import pandas as pd
 import dash_mantine_components as dmc
 from dash_iconify import DashIconify
 import dash
-from dash import html, dcc, callback, Input, Output
-import plotly.figure_factory as ff
-import plotly.express as px
-from datetime import datetime, date
+from dash import html, dcc, callback, Input, Output, State
+from datetime import datetime, date, timedelta
+from flask import Response, request
+from functools import lru_cache
+from urllib.parse import urlencode
+import os
+import sys
+import threading
 import warnings
 
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
+# Modules shared by both dashboards live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 from utils import *
+from common.exports import DOWNLOAD_EXPORT_JS, export_response
+from common.metrics import instrument
+from data_source import SAMPLES_XLSX, load_samples
 
 pd.set_option("display.max_columns", 200)
 pd.set_option("display.max_rows", 200)
 
-df = pd.read_excel(
-    r"C:\Users\DLP-I512-03\Desktop\OneDrive - UsefulBI Corporation\Artemis Test Features\Plotly Figure Friday 2025\Week 2\sample_with_coordinates.xlsx"
-)
-# for c in df.columns:
-#     print(c)
+# Point PLASTICLIST_SOURCE at another copy of the workbook; the cleaned
+# frame is cached as Parquet in PLASTICLIST_CACHE_DIR (see data_source.py)
+df = load_samples(SAMPLES_XLSX)
+
+# Chemical results by (product, id, unit), parsed once for the test results chart
+test_index = build_test_index(df)
+# Sorted product names and each product's sorted sample IDs for the dropdowns
+product_index = build_product_index(df)
+# Preselected on the test results tab and used by exports until that tab is opened
+default_product = "Whole Foods Organic Broccoli"
+
+
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
+server = app.server
+callback_metrics = instrument(app)
+
+
+def get_supchain_layout():
+    # The map page is served separately so browsers can cache it (see /map)
+    fig_3_1 = html.Iframe(src="/map", width="100%", height="500px")
+    fig_3_2 = dcc.Graph(figure=line_chart_shipment_trends(df))
+    fig_3_3, style_gantt = get_product_timeline_gantt(df)
+    gantt_chart = html.Div(dcc.Graph(figure=fig_3_3), style=style_gantt)
+    return html.Div(
+        [
+            html.H3("Sample Collection Locations"),
+            fig_3_1,
+            html.H3("Collection, Shipment & Arrival Trends over Time"),
+            fig_3_2,
+            html.H3(
+                "Product Journey Timeline: Manfufacturing to Lab-Test"
+            ),
+            gantt_chart,
+        ]
+    )
+
+
+def get_category_layout():
+    fig_1_1 = dcc.Graph(figure=top_tags(df))
+    return html.Div(
+        [
+            html.H3("Sample Test Results"),
+            dmc.Group(
+                [
+                    dmc.Select(
+                        id="product-dropdown",
+                        label="Select Product",
+                        data=product_options(product_index, selected=default_product),
+                        value=default_product,
+                        searchable=True,
+                        debounce=200,
+                        style={"width": "40%"},
+                    ),
+                    dmc.Select(
+                        id="id-dropdown",
+                        label="Select Sample ID ",
+                        data=[],
+                        searchable=True,
+                    ),
+                    dmc.Select(
+                        id="unit-dropdown",
+                        label="Select Unit of Measurement (UoM)",
+                        data=distinct_units,
+                        value="ng_g",
+                        searchable=True,
+                        style={"width": "20%"},
+
+                    ),
+                ],
+                position="apart",
+            ),
+            html.Div(dcc.Graph(id='test-results-fig', figure=test_results(test_index))),                        
+            html.H3(
+                "Top 15 Most Common Product Tags from Collected Samples"
+            ),
+            fig_1_1,
+            ]
+    )
 
-df["collected_at_truncated"] = df["collected_at"].apply(
-    lambda x: str(x)[:20] if x else x
-)
-df["product_truncated"] = df["product"].apply(lambda x: str(x)[:20] if x else x)
-df["tags"] = df["tags"].apply(lambda x: str(x).replace("_", " ").title() if x else x)
-df["tags_truncated"] = df["tags"].apply(lambda x: str(x)[:20] if x else x)
-df["lots_truncated"] = df["lot_no"].apply(lambda x: str(x)[:20] if x else x)
 
-distinct_units = ['ng_g', 'ng_serving', 'percent_tdi_14_kg_epa', 'percent_tdi_14_kg_efsa',  'percent_tdi_70_kg_epa', 'percent_tdi_70_kg_efsa', 'percentile_ng_g', 'percentile_ng_serving']
+# Expiration figures per reference date; the date-independent columns are
+# selected once and only days to expire and status are recomputed per date
+expiration_base = df[expiration_columns]
+EXPIRATION_CLOCK_MS = 15 * 60 * 1000
+rollover = {}
 
 
-# Ensure dates are in datetime format
-date_columns = [
-    "manufacturing_date",
-    "expiration_date",
-    "collected_on",
-    "shipped_on",
-    "arrived_at_lab_on",
-]
-for col in date_columns:
-    df[col] = pd.to_datetime(df[col], errors="coerce").fillna(
-        method="ffill"
-    )  # Example: Forward fill missing dates
+@lru_cache(maxsize=32)
+def expiration_figures(as_of):
+    classified = classify_expiration(expiration_base, as_of)
+    statuses = [
+        (fig.to_dict(), style)
+        for fig, style in (
+            exp_risk_assessment(lots, status=s)
+            for s, lots in lots_by_status(classified).items()
+        )
+    ]
+    return statuses, treemap_expired_by_tags(classified).to_dict()
 
-df["shipping_time"] = (
-    df["arrived_at_lab_on"] - df["shipped_on"]
-).dt.days  # Shipping time
 
+def schedule_rollover():
+    # One timer per process (gunicorn workers don't inherit threads) builds the
+    # new day's figures just after midnight, so the first visit is a cache hit
+    if rollover.get("pid") == os.getpid():
+        return
+    rollover["pid"] = os.getpid()
 
-app = dash.Dash(__name__)
+    def refresh():
+        expiration_figures(date.today())
+        start()
 
-# Category Charts
-fig_1_1 = dcc.Graph(figure=top_tags(df))
+    def start():
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        timer = threading.Timer((midnight - now).total_seconds() + 1, refresh)
+        timer.daemon = True
+        timer.start()
 
-# Exp Charts
-figs = [
-    exp_risk_assessment(df, status=s)
-    for s in ["Expired", "Critical", "Nearing Expiration", "Safe"]
-]
-children = [html.Div(dcc.Graph(figure=f[0]), style=f[1]) for f in figs]
-fig_2_1 = dmc.Group(children, style={"width": "100%"})
+    start()
 
-fig_2_2 = treemap_expired_by_tags(df)
-fig_2_2 = html.Div(dcc.Graph(figure=fig_2_2))
-fig_2_3, style_div = bar_chart_expiring_soon_by_tags(df)
-fig_2_3 = html.Div(dcc.Graph(figure=fig_2_3), style=style_div)
 
-# SupChain Charts
-fig_3_1 = html.Iframe(srcDoc=folium_map(df), width="100%", height="500px")
-fig_3_2 = dcc.Graph(figure=line_chart_shipment_trends(df))
-fig_3_3, style_gantt = get_product_timeline_gantt(df)
-gantt_chart = html.Div(dcc.Graph(figure=fig_3_3), style=style_gantt)
+def get_expiration_children(as_of):
+    statuses, treemap = expiration_figures(as_of)
+    label = "Today" if as_of == date.today() else as_of.strftime("%d %b %Y")
+    children = [html.Div(dcc.Graph(figure=f[0]), style=f[1]) for f in statuses]
+    fig_2_1 = dmc.Group(children, style={"width": "100%"})
+    fig_2_2 = html.Div(dcc.Graph(figure=treemap))
+    return [
+        html.H3(
+            f"No. of Days to Expire for Each Product Lot as of {label}"
+        ),
+        fig_2_1,
+        dmc.Space(h=30),
+        html.H3(
+            f"Top 10 Tags with Most Product Lots Expired as of {label}"
+        ),
+        fig_2_2,
+    ]
+
+
+def get_expiration_layout():
+    return html.Div(
+        [
+            dmc.Space(h=10),
+            dmc.Group(
+                [
+                    html.H4("As of: "),
+                    dmc.DatePicker(
+                        id="as-of-date",
+                        placeholder="Today",
+                        inputFormat="DD MMM YYYY",
+                        clearable=True,
+                        style={"width": "200px"},
+                    ),
+                ]
+            ),
+            dcc.Interval(id="expiration-clock", interval=EXPIRATION_CLOCK_MS),
+            dcc.Store(id="expiration-rendered"),
+            html.Div(id="expiration-figures"),
+        ]
+    )
+
+
+tab_builders = {
+    "supchain": get_supchain_layout,
+    "category": get_category_layout,
+    "expiration": get_expiration_layout,
+}
+
+
+# Tab contents are built the first time any user opens them, then reused
+@lru_cache(maxsize=None)
+def tab_content(tab):
+    return tab_builders[tab]()
 
 
 app.layout = html.Div(
@@ -82,11 +208,27 @@ app.layout = html.Div(
                 html.H1(
                     "Plotly Figure Friday 2025 Week 2 - Exploring Data on Plastic Chemicals in Bay Area Foods"
                 ),
-                dmc.Button("Export Data", id="export-btn"),
+                dmc.Group(
+                    [
+                        dmc.Select(
+                            id="export-format",
+                            data=[
+                                {"label": "CSV", "value": "csv"},
+                                {"label": "CSV (gzip)", "value": "csv.gz"},
+                                {"label": "Parquet", "value": "parquet"},
+                            ],
+                            value="csv",
+                            style={"width": "130px"},
+                        ),
+                        dmc.Button("Export Data", id="export-btn"),
+                        dmc.Text(id="export-error", color="red", size="sm"),
+                    ]
+                ),
             ],
             position="apart",
         ),
-        dcc.Download(id="download-data"),
+        dcc.Store(id="export-url"),
+        dcc.Store(id="product-store", data=default_product),
         dmc.Tabs(
             [
                 dmc.TabsList(
@@ -109,98 +251,61 @@ app.layout = html.Div(
                     ],
                     grow=True,
                 ),
-                dmc.TabsPanel(
-                    html.Div(
-                        [
-                            html.H3("Sample Collection Locations"),
-                            fig_3_1,
-                            html.H3("Collection, Shipment & Arrival Trends over Time"),
-                            fig_3_2,
-                            html.H3(
-                                "Product Journey Timeline: Manfufacturing to Lab-Test"
-                            ),
-                            gantt_chart,
-                        ]
-                    ),
-                    value="supchain",
-                ),
-                dmc.TabsPanel(
-                    html.Div(
-                        [
-                            html.H3("Sample Test Results"),
-                            dmc.Group(
-                                [
-                                    dmc.Select(
-                                        id="product-dropdown",
-                                        label="Select Product",
-                                        data=df["product"].dropna().unique(),
-                                        value="Whole Foods Organic Broccoli",
-                                        searchable=True,
-                                        style={"width": "40%"},
-                                    ),
-                                    dmc.Select(
-                                        id="id-dropdown",
-                                        label="Select Sample ID ",
-                                        data=[],
-                                        searchable=True,
-                                    ),
-                                    dmc.Select(
-                                        id="unit-dropdown",
-                                        label="Select Unit of Measurement (UoM)",
-                                        data=distinct_units,
-                                        value="ng_g",
-                                        searchable=True,
-                                        style={"width": "20%"},
-
-                                    ),
-                                ],
-                                position="apart",
-                            ),
-                            html.Div(dcc.Graph(id='test-results-fig', figure=test_results(df))),                        
-                            html.H3(
-                                "Top 15 Most Common Product Tags from Collected Samples"
-                            ),
-                            fig_1_1,
-                            ]
-                    ),
-                    value="category",
-                ),
-                dmc.TabsPanel(
-                    html.Div(
-                        [
-                            html.H3(
-                                "No. of Days to Expire for Each Product Lot as of Today"
-                            ),
-                            fig_2_1,
-                            dmc.Space(h=30),
-                            html.H3(
-                                "Top 10 Tags with Most Product Lots Expired as of Today"
-                            ),
-                            fig_2_2,
-                        ]
-                    ),
-                    value="expiration",
-                ),
-                
+                dmc.TabsPanel(html.Div(id="supchain-panel"), value="supchain"),
+                dmc.TabsPanel(html.Div(id="category-panel"), value="category"),
+                dmc.TabsPanel(html.Div(id="expiration-panel"), value="expiration"),
             ],
+            id="tabs",
             color="red",
             value="supchain",
         ),
     ],
 )
 
+@callback(
+    Output("supchain-panel", "children"),
+    Output("category-panel", "children"),
+    Output("expiration-panel", "children"),
+    Input("tabs", "value"),
+    State("supchain-panel", "children"),
+    State("category-panel", "children"),
+    State("expiration-panel", "children"),
+)
+def render_tab(tab, *rendered):
+    # Panels that are already on the page keep their state (e.g. the selected product)
+    return [
+        tab_content(name) if name == tab and current is None else dash.no_update
+        for name, current in zip(tab_builders, rendered)
+    ]
+
+
+@callback(Output("product-store", "data"), Input("product-dropdown", "value"))
+def store_product(product):
+    return product
+
+
 @callback(
     Output("id-dropdown", "data"),
     Output("id-dropdown", "value"),
     Input("product-dropdown", "value"),
 )
 def load_sample_id_options(product):
-    if product:
-        data = df[df['product'] == product]['id'].astype('str').unique()
-        return data, data[0] 
+    data = sample_id_options(product_index, product)
+    if data:
+        return data, data[0]
     raise dash.exceptions.PreventUpdate
 
 
+@callback(
+    Output("product-dropdown", "data"),
+    Input("product-dropdown", "searchValue"),
+    State("product-dropdown", "value"),
+    prevent_initial_call=True,
+)
+def filter_product_options(search, product):
+    return product_options(product_index, search, product)
+
+
 @callback(
     Output("test-results-fig", "figure"),
     Input("product-dropdown", "value"),
@@ -210,20 +315,66 @@ def load_sample_id_options(product):
 )
 def load_test_results(product, id, unit):
     if product and id and unit:        
-        return test_results(df, product, int(id), unit)
+        return test_results(test_index, product, int(id), unit)
     raise dash.exceptions.PreventUpdate
 
 
+@lru_cache(maxsize=1)
+def map_page():
+    return folium_map(df)
+
+
+@callback(
+    Output("expiration-figures", "children"),
+    Output("expiration-rendered", "data"),
+    Input("as-of-date", "value"),
+    Input("expiration-clock", "n_intervals"),
+    State("expiration-rendered", "data"),
+)
+def update_expiration(as_of, n_intervals, rendered):
+    # The clock only matters when following today: it moves the page to the
+    # new date after midnight and is a no-op otherwise
+    schedule_rollover()
+    as_of = date.fromisoformat(as_of[:10]) if as_of else date.today()
+    if rendered == as_of.isoformat():
+        raise dash.exceptions.PreventUpdate
+    return get_expiration_children(as_of), as_of.isoformat()
+
+
+@app.server.route("/map")
+def sample_map():
+    response = Response(map_page(), mimetype="text/html")
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.server.route("/export")
+def export_data():
+    product = request.args.get("product")
+    data = df[df["product"] == product] if product else df
+    return export_response(data, request.args.get("format", "csv"), "plasticlist_data")
+
+
 @app.callback(
-    Output("download-data", "data"),
+    Output("export-url", "data"),
     Input("export-btn", "n_clicks"),
+    State("export-format", "value"),
+    State("product-store", "data"),
     prevent_initial_call=True
 )
-def export_dataframe(n_clicks):
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_buffer.seek(0)      
-    return dcc.send_bytes(csv_buffer.getvalue().encode(), "plasticlist_data.csv")
+def export_dataframe(n_clicks, fmt, product):
+    # n_clicks keeps the URL unique so repeated clicks trigger a new download
+    query = {"format": fmt or "csv", "product": product or "", "n": n_clicks}
+    return "/export?" + urlencode(query)
+
+
+app.clientside_callback(
+    DOWNLOAD_EXPORT_JS,
+    Output("export-error", "children"),
+    Input("export-url", "data"),
+    prevent_initial_call=True,
+)
 
 
 if __name__ == "__main__":
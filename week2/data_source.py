@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Modules shared by both dashboards live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import distinct_units
+from common import file_cache
+from common.file_cache import write_cache
+
+SAMPLES_XLSX = os.environ.get("PLASTICLIST_SOURCE", "sample_with_coordinates.xlsx")
+CACHE_DIR = os.environ.get("PLASTICLIST_CACHE_DIR", ".cache")
+# Bump whenever prepare_samples changes so stale caches are ignored
+PIPELINE_VERSION = 3
+
+date_columns = [
+    "manufacturing_date",
+    "expiration_date",
+    "collected_on",
+    "shipped_on",
+    "arrived_at_lab_on",
+]
+# Lot numbers mix text, integers and times in the workbook; they are kept as
+# text so a cached load returns the same values as a fresh parse
+text_columns = ["lot_no"]
+# Display labels derived from raw columns: (source, truncate width, title-case);
+# in order, so "tags" is title-cased before "tags_truncated" is cut from it
+label_specs = {
+    "collected_at_truncated": ("collected_at", 20, False),
+    "product_truncated": ("product", 20, False),
+    "tags": ("tags", None, True),
+    "tags_truncated": ("tags", 20, False),
+    "lots_truncated": ("lot_no", 20, False),
+}
+
+
+def excel_engine():
+    # calamine (Rust) parses xlsx several times faster than openpyxl
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return None
+    return "calamine"
+
+
+def is_result_column(column):
+    return any(column.endswith(f"_{unit}") for unit in distinct_units)
+
+
+def read_workbook(source=SAMPLES_XLSX):
+    return pd.read_excel(source, engine=excel_engine())
+
+
+def normalize_label(values, width=None, title=False):
+    # Only the distinct values are formatted; rows are mapped back through
+    # integer codes. Falsy values (None, "") pass through unchanged while NaN
+    # is formatted like any other value, as str() does
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    uniques = pd.Series(uniques, dtype=object)
+    labels = uniques.astype(str)
+    if title:
+        labels = labels.str.replace("_", " ").str.title()
+    if width:
+        labels = labels.str[:width]
+    falsy = uniques.isin(["", 0]) | (uniques.isna() & uniques.map(lambda x: x is None))
+    labels = labels.where(~falsy, uniques)
+    # Sorted categories keep groupby output in the same order as plain strings
+    label_codes, categories = pd.factorize(labels, sort=True)
+    return pd.Series(
+        pd.Categorical.from_codes(label_codes[codes], categories), index=values.index
+    )
+
+
+def normalize_labels(df, specs=label_specs):
+    for target, (source, width, title) in specs.items():
+        df[target] = normalize_label(df[source], width, title)
+    return df
+
+
+def prepare_samples(df):
+    for col in text_columns:
+        df[col] = df[col].map(lambda x: x if isinstance(x, str) or pd.isna(x) else str(x))
+    df = normalize_labels(df)
+
+    for col in date_columns:
+        # Missing dates take the previous sample's date
+        df[col] = pd.to_datetime(df[col], errors="coerce").ffill()
+
+    df["shipping_time"] = (df["arrived_at_lab_on"] - df["shipped_on"]).dt.days
+    return df
+
+
+def cache_path(source, cache_dir=CACHE_DIR):
+    return file_cache.cache_path(source, cache_dir, PIPELINE_VERSION, ".parquet")
+
+
+def to_storable(df):
+    # Parquet columns need a single type: results that mix numbers with
+    # labels such as "<LOQ" are stored as text and parsed back on read
+    mixed = [c for c in df.columns if df[c].dtype == object and c not in date_columns]
+    return df.assign(
+        **{c: df[c].map(lambda x: x if isinstance(x, str) or pd.isna(x) else str(x)) for c in mixed}
+    )
+
+
+def restore_number(value):
+    if not isinstance(value, str):
+        return value
+    for parse in (int, float):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return value
+
+
+def from_storable(df):
+    # Missing text comes back from Parquet as None where the workbook gives NaN
+    text = [c for c in df.columns if df[c].dtype == object]
+    df = df.assign(**{c: df[c].where(df[c].notna(), np.nan) for c in text})
+    results = [c for c in text if is_result_column(c)]
+    return df.assign(**{c: df[c].map(restore_number) for c in results})
+
+
+def build_cache(source=SAMPLES_XLSX, cache_dir=CACHE_DIR):
+    df = prepare_samples(read_workbook(source))
+    write_cache(
+        cache_path(source, cache_dir),
+        lambda tmp: to_storable(df).to_parquet(tmp, index=False),
+    )
+    return df
+
+
+def load_samples(source=SAMPLES_XLSX, cache_dir=CACHE_DIR):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return prepare_samples(read_workbook(source))
+
+    path = cache_path(source, cache_dir)
+    if os.path.exists(path):
+        return from_storable(pd.read_parquet(path))
+    return build_cache(source, cache_dir)
+
+
+def clear_cache(source=None, cache_dir=CACHE_DIR):
+    return file_cache.clear_cache(source, cache_dir, ".parquet")
+
+
+def startup_report(source=SAMPLES_XLSX, cache_dir=CACHE_DIR):
+    start = time.perf_counter()
+    prepare_samples(read_workbook(source))
+    cold = time.perf_counter() - start
+
+    if not os.path.exists(cache_path(source, cache_dir)):
+        build_cache(source, cache_dir)
+
+    start = time.perf_counter()
+    load_samples(source, cache_dir)
+    warm = time.perf_counter() - start
+
+    print(f"excel engine: {excel_engine() or 'openpyxl'}")
+    print(f"cold start (read_excel + derive): {cold:.3f}s")
+    print(f"warm start (hash + parquet): {warm:.3f}s")
+    print(f"speedup: {cold / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    file_cache.cache_cli(
+        "Manage the sample data cache",
+        SAMPLES_XLSX,
+        CACHE_DIR,
+        build_cache,
+        clear_cache,
+        cache_path,
+        startup_report,
+    )
@@ -1,17 +1,19 @@
 import pandas as pd
 import numpy as np
-import plotly.figure_factory as ff
 import plotly.express as px
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 import dash_mantine_components as dmc
 import folium
-from folium import Choropleth, Circle, Marker
-from folium.plugins import HeatMap, MarkerCluster
-import math
+from folium import Choropleth, Circle
+from folium.plugins import FastMarkerCluster, HeatMap
+import hashlib
+import os
 import io
 from collections import Counter
 
+from common.file_cache import write_cache
+
 
 def top_tags(df):
     tag_counts = Counter(
@@ -36,47 +38,89 @@ def top_tags(df):
     return fig
 
 
+gantt_stages = {
+    "Manufacturing to Collection": ("manufacturing_date", "collected_on"),
+    "Collection to Shipment": ("collected_on", "shipped_on"),
+    "Shipment to Arrival": ("shipped_on", "arrived_at_lab_on"),
+}
+# The colors ff.create_gantt assigned (default palette over sorted stage names)
+gantt_colors = {
+    "Manufacturing to Collection": "rgb(255, 127, 14)",
+    "Collection to Shipment": "rgb(31, 119, 180)",
+    "Shipment to Arrival": "rgb(44, 160, 44)",
+}
+
+
+def gantt_intervals(df, rows):
+    # One row per (sample, stage), built column-wise instead of row by row
+    starts = df[[start for start, _ in gantt_stages.values()]]
+    finishes = df[[finish for _, finish in gantt_stages.values()]]
+    intervals = pd.DataFrame(
+        {
+            "Task": np.tile(df["product_truncated"].to_numpy(), len(gantt_stages)),
+            "Row": np.tile(rows, len(gantt_stages)),
+            "Stage": np.repeat(list(gantt_stages), len(df)),
+            "Start": starts.melt()["value"].to_numpy(),
+            "Finish": finishes.melt()["value"].to_numpy(),
+        }
+    )
+    return intervals.dropna(subset=["Start", "Finish"])
+
+
 def get_product_timeline_gantt(df):
-    gantt_data = []
-    for _, row in df.iterrows():
-        gantt_data.append(
-            {
-                "Task": row["product_truncated"],
-                "Start": row["manufacturing_date"],
-                "Finish": row["collected_on"],
-                "Stage": "Manufacturing to Collection",
-            }
-        )
-        gantt_data.append(
-            {
-                "Task": row["product_truncated"],
-                "Start": row["collected_on"],
-                "Finish": row["shipped_on"],
-                "Stage": "Collection to Shipment",
-            }
-        )
-        gantt_data.append(
-            {
-                "Task": row["product_truncated"],
-                "Start": row["shipped_on"],
-                "Finish": row["arrived_at_lab_on"],
-                "Stage": "Shipment to Arrival",
-            }
+    # Tasks are grouped onto one row each, first product on top
+    codes, tasks = pd.factorize(df["product_truncated"])
+    task_count = len(tasks)
+    intervals = gantt_intervals(df, task_count - 1 - codes)
+
+    fig_gantt = go.Figure()
+    for stage, rows in intervals.groupby("Stage", sort=False):
+        start = rows["Start"].dt.strftime("%Y-%m-%d")
+        finish = rows["Finish"].dt.strftime("%Y-%m-%d")
+        fig_gantt.add_trace(
+            go.Bar(
+                name=stage,
+                orientation="h",
+                y=rows["Row"],
+                # The full timestamp, so base + x ends exactly at Finish
+                base=rows["Start"],
+                x=(rows["Finish"] - rows["Start"]).dt.total_seconds() * 1000,
+                width=0.4,
+                marker_color=gantt_colors[stage],
+                customdata=np.column_stack([rows["Task"], start, finish]),
+                hovertemplate="%{customdata[0]}<br>%{customdata[1]} to %{customdata[2]}",
+            )
         )
 
-    gantt_df = pd.DataFrame(gantt_data)
-
-    fig_gantt = ff.create_gantt(
-        gantt_df,
+    fig_gantt.update_layout(
         title="",
-        index_col="Stage",
-        show_colorbar=True,
-        group_tasks=True,
-        showgrid_x=True,
-        showgrid_y=True,
-        height=max(
-            600, 40 * gantt_df["Task"].nunique()
-        ),  # Dynamic height based on tasks
+        barmode="overlay",
+        hovermode="closest",
+        showlegend=True,
+        height=max(600, 40 * task_count),  # Dynamic height based on tasks
+        xaxis=dict(
+            type="date",
+            showgrid=True,
+            zeroline=False,
+            rangeselector=dict(
+                buttons=[
+                    dict(count=7, label="1w", step="day", stepmode="backward"),
+                    dict(count=1, label="1m", step="month", stepmode="backward"),
+                    dict(count=6, label="6m", step="month", stepmode="backward"),
+                    dict(count=1, label="YTD", step="year", stepmode="todate"),
+                    dict(count=1, label="1y", step="year", stepmode="backward"),
+                    dict(step="all"),
+                ]
+            ),
+        ),
+        yaxis=dict(
+            tickvals=list(range(task_count)),
+            ticktext=list(tasks)[::-1],
+            range=[-1, task_count],
+            autorange=False,
+            showgrid=True,
+            zeroline=False,
+        ),
     )
 
     fig_gantt.update_layout(
@@ -89,7 +133,7 @@ def get_product_timeline_gantt(df):
 
     style_gantt = (
         {}
-        if gantt_df["Task"].nunique() <= 15
+        if task_count <= 15
         else {"max-height": "400px", "overflow-y": "auto"}
     )
 
@@ -99,10 +143,11 @@ def get_product_timeline_gantt(df):
 def treemap_tags_products(df):
     df["lot_no"].fillna("No Lot Data")
     df_grouped = (
-        df.groupby(["tags", "product", "lot_no"])
+        df.groupby(["tags", "product", "lot_no"], observed=True)
         .size()
         .reset_index(name="count")
         .sort_values(by="count", ascending=False)
+        .astype({"tags": str})
     )
 
     fig = px.treemap(
@@ -189,17 +234,6 @@ def line_chart_shipment_trends(df):
     return fig
 
 
-def get_exp_status(d):
-    if d < 0:
-        return "Expired"
-    if d <= 30:
-        return "Critical"
-    if d <= 90:
-        return "Nearing Expiration"
-    if d <= 180:
-        return "Safe"
-
-
 color_dict = {
     "Expired": "Grey",
     "Critical": "#fc3737",
@@ -208,14 +242,40 @@ color_dict = {
 }
 
 
-def exp_risk_assessment(df, status, exp_date=pd.Timestamp.today()):
-    df = df.dropna(subset=["lots_truncated", "lot_no", "product_truncated"])
-    df["days_to_expire"] = (df["expiration_date"] - exp_date).dt.days
-    df["exp_status"] = df["days_to_expire"].apply(
-        lambda x: get_exp_status(x) if x else None
+# Upper bounds (inclusive, in whole days) of the color_dict statuses, in
+# order; lots more than 180 days out have no status
+exp_status_bins = [-np.inf, -1, 30, 90, 180]
+# Everything the expiration charts read, so classifying never copies the wide frame
+expiration_columns = [
+    "product",
+    "product_truncated",
+    "tags_truncated",
+    "lot_no",
+    "lots_truncated",
+    "expiration_date",
+]
+
+
+def classify_expiration(df, exp_date=None):
+    # Days are counted from midnight of the reference date (today by default)
+    exp_date = pd.Timestamp(exp_date or pd.Timestamp.today()).normalize()
+    days = (df["expiration_date"] - exp_date).dt.days
+    return df[expiration_columns].assign(
+        days_to_expire=days,
+        exp_status=pd.cut(days, bins=exp_status_bins, labels=list(color_dict)),
     )
-    df = df[df["exp_status"] == status]
-    df = df.sort_values(by="days_to_expire", ascending=False)
+
+
+def lots_by_status(classified):
+    # Lots for each status chart, most days left first, from a single groupby
+    lots = classified.dropna(subset=["lots_truncated", "lot_no", "product_truncated"])
+    lots = lots.sort_values(by="days_to_expire", ascending=False, kind="stable")
+    groups = dict(list(lots.groupby("exp_status", observed=True, sort=False)))
+    return {status: groups.get(status, lots.iloc[:0]) for status in color_dict}
+
+
+def exp_risk_assessment(df, status):
+    df = df.astype({"exp_status": str})
 
     fig = px.bar(
         df,
@@ -250,12 +310,10 @@ def exp_risk_assessment(df, status, exp_date=pd.Timestamp.today()):
     return fig, style_div
 
 
-def bar_chart_expiring_soon_by_tags(df, exp_date=pd.Timestamp.today()):
-    df["days_to_expire"] = (df["expiration_date"] - exp_date).dt.days
-
+def bar_chart_expiring_soon_by_tags(df):
     df_expiring_soon = df[(df["days_to_expire"] >= 0)]
     df_expiring_soon = (
-        df_expiring_soon.groupby("tags_truncated")["product_truncated"]
+        df_expiring_soon.groupby("tags_truncated", observed=True)["product_truncated"]
         .size()
         .reset_index(name="count")
     )
@@ -286,24 +344,24 @@ def bar_chart_expiring_soon_by_tags(df, exp_date=pd.Timestamp.today()):
     return fig, style_div
 
 
-def treemap_expired_by_tags(df, exp_date=pd.Timestamp.today()):
-    df["days_to_expire"] = (df["expiration_date"] - exp_date).dt.days
-
-    df_expiring_soon = df[df["days_to_expire"] < 0].copy()
+def treemap_expired_by_tags(df):
+    df_expiring_soon = df[df["exp_status"] == "Expired"].copy()
 
     df_expiring_soon["lot_no"].fillna("No Data", inplace=True)
 
     df_grouped = (
-        df_expiring_soon.groupby(["tags_truncated", "product_truncated"])["lot_no"]
+        df_expiring_soon.groupby(["tags_truncated", "product_truncated"], observed=True)["lot_no"]
         .nunique()
         .reset_index(name="lot_count")
     )
 
     # Get the top 10 tags based on total expired lots
     top_tags = (
-        df_grouped.groupby("tags_truncated")["lot_count"].sum().nlargest(10).index
+        df_grouped.groupby("tags_truncated", observed=True)["lot_count"].sum().nlargest(10).index
     )
     df_filtered = df_grouped[df_grouped["tags_truncated"].isin(top_tags)]
+    # px.treemap expands categorical paths into every category combination
+    df_filtered = df_filtered.astype({"tags_truncated": str, "product_truncated": str})
 
     fig = px.treemap(
         df_filtered,
@@ -333,25 +391,88 @@ def treemap_expired_by_tags(df, exp_date=pd.Timestamp.today()):
     return fig
 
 
-def folium_map(df):
-    cdf = df[["collected_at", "location_lat_lon", "latitude", "longitude"]]
-    cdf.dropna(inplace=True)
-
+MAP_CACHE_DIR = os.environ.get("PLASTICLIST_CACHE_DIR", ".cache")
+# Samples are merged into grid cells this zoom level would draw about
+# MAP_CELL_PX apart; bump MAP_VERSION when the rendering below changes
+MAP_CELL_ZOOM = 14
+MAP_CELL_PX = 20
+MAP_VERSION = 1
+
+# Each row of the marker array is [lat, lon, samples]; clusters add up samples
+MAP_MARKER_CALLBACK = """function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.options.samples = row[2];
+    marker.bindTooltip(row[2] + (row[2] == 1 ? " sample" : " samples"));
+    return marker;
+}"""
+MAP_CLUSTER_ICON = """function (cluster) {
+    var samples = cluster.getAllChildMarkers().reduce(
+        function (total, marker) { return total + marker.options.samples; }, 0
+    );
+    var size = samples < 10 ? "small" : samples < 100 ? "medium" : "large";
+    return L.divIcon({
+        html: "<div><span>" + samples + "</span></div>",
+        className: "marker-cluster marker-cluster-" + size,
+        iconSize: new L.Point(40, 40),
+    });
+}"""
+
+
+def map_points(df):
+    cdf = df[["collected_at", "location_lat_lon", "latitude", "longitude"]].dropna()
+    return cdf[["latitude", "longitude"]].to_numpy(dtype="float64")
+
+
+def grid_clusters(points, zoom=MAP_CELL_ZOOM, cell_px=MAP_CELL_PX):
+    # Web map tiles are 256px wide, so a zoom level spans 256 * 2**zoom px
+    # around the globe; points are binned on that grid and placed at the mean
+    # of their cell
+    cell = 360 / (256 * 2**zoom) * cell_px
+    cells = np.floor(points / cell).astype("int64")
+    _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    lat = np.bincount(inverse, weights=points[:, 0]) / counts
+    lon = np.bincount(inverse, weights=points[:, 1]) / counts
+    return pd.DataFrame({"latitude": lat, "longitude": lon, "count": counts})
+
+
+def map_key(points):
+    digest = hashlib.sha256(points.tobytes())
+    digest.update(f"{MAP_VERSION}:{MAP_CELL_ZOOM}:{MAP_CELL_PX}".encode())
+    return digest.hexdigest()[:16]
+
+
+def render_map(clusters):
     m_3 = folium.Map(
         location=[37.48228115, -122.23169528052277],
         tiles="cartodbpositron",
         zoom_start=4,
     )
-
-    mc = MarkerCluster()
-    for idx, row in cdf.iterrows():
-        if not math.isnan(row["latitude"]) and not math.isnan(row["longitude"]):
-            mc.add_child(Marker([row["latitude"], row["longitude"]]))
-    m_3.add_child(mc)
+    FastMarkerCluster(
+        clusters[["latitude", "longitude", "count"]].values.tolist(),
+        callback=MAP_MARKER_CALLBACK,
+        icon_create_function=MAP_CLUSTER_ICON,
+    ).add_to(m_3)
 
     map_bytes = io.BytesIO()
     m_3.save(map_bytes, close_file=False)
-    map_html = map_bytes.getvalue().decode("utf-8")  
+    return map_bytes.getvalue().decode("utf-8")
+
+
+def folium_map(df, cache_dir=MAP_CACHE_DIR):
+    points = map_points(df)
+    path = os.path.join(cache_dir, f"map-{map_key(points)}.html")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    map_html = render_map(grid_clusters(points))
+
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(map_html)
+
+    write_cache(path, write)
     return map_html
 
 
@@ -376,6 +497,18 @@ def convert_str_to_int(string):
     return string
 
 
+distinct_units = [
+    "ng_g",
+    "ng_serving",
+    "percent_tdi_14_kg_epa",
+    "percent_tdi_14_kg_efsa",
+    "percent_tdi_70_kg_epa",
+    "percent_tdi_70_kg_efsa",
+    "percentile_ng_g",
+    "percentile_ng_serving",
+]
+
+
 chemicals = [
     "DEHP_equivalents",
     "DEHP",
@@ -399,20 +532,54 @@ chemicals = [
 ]
 
 
-def test_results(
-    df, product="Whole Foods Organic Broccoli", sample_id=7091002, unit="ng_serving"
-):
+def parse_result_labels(labels):
+    # convert_str_to_int runs once per distinct label; labels it leaves as
+    # text (e.g. "NO RESULT", ">2500") have no numeric value
+    codes, uniques = pd.factorize(labels)
+    parsed = pd.to_numeric(
+        pd.Series([convert_str_to_int(label) for label in uniques], dtype=object),
+        errors="coerce",
+    ).to_numpy(dtype="float64")
+    return np.where(codes >= 0, parsed[codes], np.nan)
+
+
+def build_test_index(df):
+    # Long table of every result, one contiguous run of chemicals per
+    # (product, id, unit), so a lookup is a dict hit plus a slice
+    frames = []
+    for unit in distinct_units:
+        suffix = f"_{unit}"
+        chemicals = {
+            c: c[: -len(suffix)]
+            for c in df.columns
+            if c.endswith(suffix) and "percentile" not in c[: -len(suffix)].lower()
+        }
+        frames.append(
+            df[["product", "id", *chemicals]]
+            .rename(columns=chemicals)
+            .melt(id_vars=["product", "id"], var_name="chemical", value_name="labels")
+            .assign(unit=unit)
+        )
+    table = pd.concat(frames, ignore_index=True)
+    table = table.sort_values(["product", "id", "unit"], kind="stable", ignore_index=True)
+    table["values"] = parse_result_labels(table["labels"])
+
+    slices = {
+        key: (rows[0], rows[-1] + 1)
+        for key, rows in table.groupby(["product", "id", "unit"], sort=False).indices.items()
+    }
+    return {"table": table[["chemical", "labels", "values"]], "slices": slices}
 
-    df = df[(df["product"] == product) & (df["id"] == sample_id)]
 
-    df = df[[c for c in df.columns if unit in c]]
-    df.columns = [c.replace(f"_{unit}", "") for c in df.columns]
-    df = df.loc[:, ~df.columns.str.contains("percentile", case=False)]
+def lookup_test_results(test_index, product, sample_id, unit):
+    start, stop = test_index["slices"].get((product, sample_id, unit), (0, 0))
+    return test_index["table"].iloc[start:stop]
 
-    df = df.T.reset_index()
-    df.columns = ["chemical", "labels"]
 
-    df["values"] = df["labels"].apply(lambda x: convert_str_to_int(x))
+def test_results(
+    test_index, product="Whole Foods Organic Broccoli", sample_id=7091002, unit="ng_serving"
+):
+    df = lookup_test_results(test_index, product, sample_id, unit)
 
     fig = px.bar(
         df,
@@ -430,3 +597,45 @@ def test_results(
         margin=dict(b=20, t=30, r=10, l=10),
     )
     return fig
+
+
+# The product Select is sent at most this many options at a time
+SELECT_OPTION_LIMIT = 50
+
+
+def build_product_index(df):
+    samples = (
+        df[["product", "id"]]
+        .dropna()
+        .drop_duplicates()
+        .sort_values(["product", "id"], ignore_index=True)
+    )
+    products = samples["product"].drop_duplicates().reset_index(drop=True)
+    return {
+        "products": products,
+        "search": products.str.lower(),
+        "ids": samples["id"].astype("str").groupby(samples["product"], sort=False).agg(list).to_dict(),
+    }
+
+
+def product_options(product_index, search=None, selected=None, limit=SELECT_OPTION_LIMIT):
+    # Names starting with the search text come first, then other matches;
+    # the selected product is always included so the Select can show it
+    products = product_index["products"]
+    if search:
+        search = search.lower()
+        names = product_index["search"]
+        prefix = names.str.startswith(search)
+        matches = pd.concat(
+            [products[prefix], products[~prefix & names.str.contains(search, regex=False)]]
+        )
+    else:
+        matches = products
+    options = matches.head(limit).tolist()
+    if selected and selected not in options:
+        options.append(selected)
+    return options
+
+
+def sample_id_options(product_index, product):
+    return product_index["ids"].get(product, [])